@@ -1 +1,6 @@
-from .main import app
+# The Flask app is imported on first access, so `python -m app sweep` never loads Flask.
+def __getattr__(name):
+    if name == "app":
+        from .main import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import random
+import signal
+import logging
+import argparse
+import threading
+from app import json_codec
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Exit codes for cron / Kubernetes jobs. argparse already exits with 2 on usage errors.
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_DEGRADED = 3
+SWEEP_SCHEDULE_JITTER_FRACTION = float(os.environ.get("SWEEP_SCHEDULE_JITTER_FRACTION", "0.1"))
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def parse_duration(value):
+    """Parses '90', '90s', '15m', '6h' or '1d' into seconds."""
+    value = value.strip().lower()
+    unit = value[-1] if value and value[-1] in _DURATION_UNITS else "s"
+    number = value[:-1] if value and value[-1] in _DURATION_UNITS else value
+    try:
+        seconds = float(number) * _DURATION_UNITS[unit]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid duration: {value!r} (use e.g. 90, 15m, 6h)")
+    if seconds < 0:
+        raise argparse.ArgumentTypeError(f"duration must not be negative: {value!r}")
+    return seconds
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m app", description="Member Data Checker command line.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sweep = subparsers.add_parser("sweep", help="Run a license validation sweep and print its outcome as JSON.")
+    sweep.add_argument("--workers", type=int, default=None,
+                       help="Local worker processes; more than 1 runs a sharded sweep (default: SWEEP_WORKER_COUNT).")
+    sweep.add_argument("--no-resume", action="store_true",
+                       help="Start a new sweep even if an interrupted one could be resumed.")
+    sweep.add_argument("--no-notify", action="store_true", help="Don't send notifications for flagged members.")
+    sweep.add_argument("--full", action="store_true", help="Include every processed member in the JSON output.")
+    sweep.add_argument("--schedule", type=parse_duration, metavar="INTERVAL",
+                       help="Keep running a sweep every INTERVAL (e.g. 30m, 6h) until stopped.")
+    sweep.add_argument("--jitter", type=parse_duration, default=None,
+                       help="Random delay of up to this much added to each scheduled run (default: 10%% of INTERVAL).")
+    sweep.add_argument("--max-runs", type=int, default=None, help="With --schedule, stop after this many sweeps.")
+    return parser
+
+def run_sweep(worker_count=None, resume=True, notify=True):
+    """Runs one sweep, resuming an interrupted one first if its owner looks dead. Returns the sweep outcome dict."""
+    # Imported here so `--help` and argument errors return without touching the database.
+    from app import core_logic
+    from app.database import init_db
+    if not notify:
+        # Sharded sweep worker processes are forked from this one, so they inherit the setting.
+        core_logic.NOTIFICATIONS_ENABLED = False
+    init_db()
+    if resume:
+        resumable_run = core_logic.get_resumable_run()
+        if resumable_run and time.time() - (resumable_run["heartbeat_timestamp"] or 0) >= core_logic.SWEEP_STALE_SECONDS:
+            logger.info(f"Resuming interrupted sweep run {resumable_run['id']}.")
+            return core_logic.resume_license_validation_sweep(run_id=resumable_run["id"])
+    if worker_count is None:
+        worker_count = int(os.environ.get("SWEEP_WORKER_COUNT", "1"))
+    if worker_count > 1:
+        from app.sharded_sweep import perform_sharded_license_validation_sweep
+        return perform_sharded_license_validation_sweep(worker_count=worker_count)
+    return core_logic.perform_license_validation_sweep()
+
+def exit_code_for(outcome):
+    status = outcome.get("status")
+    if status == "completed":
+        return EXIT_OK
+    if status == "degraded":
+        return EXIT_DEGRADED
+    return EXIT_FAILED
+
+def sweep_report(outcome, full=False):
+    """The JSON document printed for one sweep; member details are left out unless full is set."""
+    report = {
+        "status": outcome.get("status"),
+        "timestamp": outcome.get("timestamp"),
+        "message": outcome.get("message"),
+        "summary": outcome.get("summary", {}),
+        "flagged_this_run": outcome.get("flagged_this_run", []),
+    }
+    if full:
+        report["all_processed_members"] = outcome.get("all_processed_members", [])
+    return report
+
+def _emit(outcome, full):
+    sys.stdout.write(json_codec.dumps(sweep_report(outcome, full), default=str) + "\n")
+    sys.stdout.flush()
+
+def run_scheduled(args):
+    """
+    Runs sweeps every args.schedule seconds (measured from the start of each run) plus a random jitter,
+    printing one JSON line per sweep. SIGTERM/SIGINT stop the loop after the current sweep; a second
+    SIGINT interrupts it (the checkpoint lets the next run resume it).
+    """
+    stop_requested = threading.Event()
+
+    def request_stop(signum, frame):
+        if stop_requested.is_set() and signum == signal.SIGINT:
+            raise KeyboardInterrupt
+        logger.info(f"Received signal {signum}; stopping after the current sweep.")
+        stop_requested.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    jitter = args.jitter if args.jitter is not None else args.schedule * SWEEP_SCHEDULE_JITTER_FRACTION
+    exit_code = EXIT_OK
+    runs = 0
+    # Jitter the first run too, so replicas started together don't sweep in lockstep.
+    stop_requested.wait(random.uniform(0, jitter))
+    while not stop_requested.is_set():
+        started = time.monotonic()
+        outcome = run_sweep(args.workers, resume=not args.no_resume, notify=not args.no_notify)
+        exit_code = exit_code_for(outcome)
+        _emit(outcome, args.full)
+        runs += 1
+        if args.max_runs and runs >= args.max_runs:
+            break
+        delay = max(0.0, args.schedule - (time.monotonic() - started)) + random.uniform(0, jitter)
+        logger.info(f"Sweep finished with status {outcome.get('status')}; next sweep in {delay:.0f}s.")
+        stop_requested.wait(delay)
+    return exit_code
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.schedule is not None:
+        return run_scheduled(args)
+    outcome = run_sweep(args.workers, resume=not args.no_resume, notify=not args.no_notify)
+    _emit(outcome, args.full)
+    return exit_code_for(outcome)
@@ -1,15 +1,26 @@
+import os
 import logging
 import time
-import json
+import socket
 import sqlite3
 from app.database import get_db_connection, init_db
+from app import json_codec
 # Ensure correct import path for integrations and notifications
-from app.integrations import wicket_api, reco_api
-from app.notifications import send_notification_for_lapsed_licenses_db # Name change reflected here
+from app.integrations import wicket_api, reco_api, reco_registry
+from app.sweep_planning import plan_sweep
+from app.filters import alert_where_clause
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sweeps commit alert changes, RECO cache writes and per-member results every N members,
+# so an interrupted sweep can be resumed from its last checkpoint instead of starting over.
+SWEEP_CHECKPOINT_INTERVAL = max(1, int(os.environ.get("SWEEP_CHECKPOINT_INTERVAL", "25")))
+# An in-progress sweep whose checkpoint heartbeat is older than this is assumed dead and may be resumed.
+SWEEP_STALE_SECONDS = int(os.environ.get("SWEEP_STALE_SECONDS", "600"))
+# Notifications need a SendGrid key; without one (or with NOTIFICATIONS_ENABLED=false) SendGrid is never imported.
+NOTIFICATIONS_ENABLED = os.environ.get("NOTIFICATIONS_ENABLED", "true").lower() == "true" and bool(os.environ.get("SENDGRID_API_KEY"))
+
 try:
     conn_test = get_db_connection()
     if conn_test:
@@ -28,11 +39,12 @@ def get_last_run_results():
     run_result = {"error": "No run history found.", "summary": {}, "all_processed_members": [], "flagged_this_run": []}
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM run_history ORDER BY run_timestamp DESC LIMIT 1")
+        # In-progress and abandoned runs have no summary yet; they're surfaced through get_resumable_run() instead.
+        cursor.execute("SELECT * FROM run_history WHERE status NOT IN ('in_progress', 'abandoned') ORDER BY run_timestamp DESC LIMIT 1")
         row = cursor.fetchone()
         if row:
-            summary_data = json.loads(row["summary"]) if row["summary"] else {}
-            all_processed_data = json.loads(row["all_processed_members_details"]) if row["all_processed_members_details"] else []
+            summary_data = json_codec.loads(row["summary"]) if row["summary"] else {}
+            all_processed_data = json_codec.loads(row["all_processed_members_details"]) if row["all_processed_members_details"] else []
             # newly_flagged_members_count is already an int, no need to parse from JSON for flagged_this_run
             # flagged_this_run will be populated by perform_license_validation_sweep or kept empty if just fetching historical
             run_result = {
@@ -47,27 +59,25 @@ def get_last_run_results():
         logger.error(f"Error fetching last run results from DB: {e}")
         run_result["error"] = f"DB error fetching results: {e}"
         return run_result
-    except json.JSONDecodeError as e:
+    except json_codec.JSONDecodeError as e:
         logger.error(f"Error decoding JSON from run_history: {e}")
         run_result["error"] = f"JSON decode error from DB: {e}"
         return run_result
     finally:
         if conn: conn.close()
 
-def get_all_alerts():
+def get_all_alerts(filters=None):
     conn = get_db_connection()
     alerts_list = []
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM alerts ORDER BY last_flagged_timestamp DESC")
+        where_sql, where_params = alert_where_clause(filters or {})
+        cursor.execute(f"SELECT * FROM alerts{where_sql} ORDER BY last_flagged_timestamp DESC", where_params)
         for row in cursor.fetchall():
             alert_dict = dict(row) # Convert sqlite3.Row to dict
-            if alert_dict.get('notification_details'):
-                try:
-                    alert_dict['notification_details'] = json.loads(alert_dict['notification_details'])
-                except json.JSONDecodeError:
-                    logger.warning(f"Could not parse notification_details JSON for alert ID {alert_dict.get('id')}")
-                    alert_dict['notification_details'] = {"error": "Could not parse details"}
+            # Decoded only if something (e.g. a template) actually reads the details.
+            alert_dict['notification_details'] = json_codec.lazy_loads(alert_dict.get('notification_details'), fallback={"error": "Could not parse details"},
+                                                                       label=f"notification_details of alert ID {alert_dict.get('id')}")
             alerts_list.append(alert_dict)
         return alerts_list
     except sqlite3.Error as e:
@@ -76,19 +86,278 @@ def get_all_alerts():
     finally:
         if conn: conn.close()
 
-def perform_license_validation_sweep():
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def get_resumable_run():
+    """Returns the most recent interrupted ('in_progress') sweep with a checkpoint, or None."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT r.id, r.run_timestamp, c.cursor, c.owner, c.heartbeat_timestamp, c.total_members
+            FROM run_history r JOIN sweep_checkpoints c ON c.run_id = r.id
+            WHERE r.status = 'in_progress'
+            ORDER BY r.run_timestamp DESC LIMIT 1
+        """)
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    except sqlite3.Error as e:
+        logger.error(f"Error fetching resumable run from DB: {e}")
+        return None
+    finally:
+        if conn: conn.close()
+
+def process_member_for_sweep(member, cursor, current_time_sweep, known_statuses=None):
+    """
+    Validates a single Wicket member against RECO and updates the alerts table.
+
+    known_statuses, if given, maps normalized RECO numbers to statuses already resolved in this
+    sweep (from the local reco_registry import, or by an earlier member with the same number);
+    only numbers missing from it are looked up, and successful lookups are added to it.
+
+    Returns a tuple of (history_entry, alert_obj_for_notification). The alert object
+    is None unless the member was flagged (newly or again) by this check.
+    """
+    wicket_reco_number = member.get("wicket_reco_number", member.get("reco_number"))
+    reco_number = reco_api.normalize_reco_number(member.get("reco_number"))
+    member_name = member.get("name", "N/A")
+    overall_status_for_history = "ok"
+
+    if not reco_number:
+        logger.warning(f"Member {member_name} missing RECO. Skipping.")
+        return {"name": member_name, "reco_number": "MISSING", "wicket_status": "active", "reco_status_details": {"status":"skipped"}, "overall_status": "skipped"}, None
+
+    if not reco_api.is_valid_reco_number(reco_number):
+        logger.warning(f"Member {member_name} has invalid RECO number '{wicket_reco_number}'. Skipping.")
+        return {"name": member_name, "reco_number": str(wicket_reco_number), "wicket_status": "active", "reco_status_details": {"status":"invalid"}, "overall_status": "invalid_reco"}, None
+
+    reco_status_details = known_statuses.get(reco_number) if known_statuses is not None else None
+    if reco_status_details is None:
+        reco_status_details = reco_api.get_license_status(wicket_reco_number, cursor.connection)
+        if known_statuses is not None and reco_status_details['status'] not in ['error', 'db_error']:
+            known_statuses[reco_number] = reco_status_details
+
+    # This object is for the 'flagged_this_run' part of the response, and for notifications
+    alert_obj_for_notification = {
+        "name": member_name, "reco_number": reco_number,
+        "status_reported_by_reco": reco_status_details['status'],
+        "last_checked_reco": reco_status_details.get('last_checked', current_time_sweep),
+        "first_flagged_timestamp": current_time_sweep, # Default to now if new
+        "last_flagged_timestamp": current_time_sweep,
+        # notification_sent_timestamp and details will be added by notification logic
+    }
+    flagged_alert = None
+
+    if reco_status_details['status'] not in ['active', 'error', 'db_error']:
+        overall_status_for_history = "flagged"
+        cursor.execute("SELECT id, first_flagged_timestamp, notification_sent_timestamp FROM alerts WHERE reco_number = ?", (reco_number,))
+        existing_alert_row = cursor.fetchone()
+        if existing_alert_row:
+            alert_obj_for_notification["first_flagged_timestamp"] = existing_alert_row["first_flagged_timestamp"]
+            # Reset notification status on re-flagging if it's a persistent issue.
+            # Or, decide if you want to notify again based on time elapsed since last notification.
+            # For now, if it's re-flagged, it becomes a candidate for notification again.
+            cursor.execute("UPDATE alerts SET last_flagged_timestamp = ?, status_reported_by_reco = ?, last_checked_reco = ?, name = ?, notification_sent_timestamp = NULL, notification_details = NULL WHERE reco_number = ?",
+                           (current_time_sweep, reco_status_details['status'], reco_status_details.get('last_checked'), member_name, reco_number))
+        else:
+            cursor.execute("INSERT INTO alerts (reco_number, name, status_reported_by_reco, last_checked_reco, first_flagged_timestamp, last_flagged_timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                           (reco_number, member_name, reco_status_details['status'], reco_status_details.get('last_checked'), current_time_sweep, current_time_sweep))
+        flagged_alert = alert_obj_for_notification
+
+    elif reco_status_details['status'] == 'active':
+        overall_status_for_history = "ok"
+        # If member is now active, remove any existing alert for them.
+        cursor.execute("DELETE FROM alerts WHERE reco_number = ?", (reco_number,))
+        if cursor.rowcount > 0: logger.info(f"Alert for RECO number {reco_number} ({member_name}) cleared as license is now active.")
+
+    elif reco_status_details['status'] in ['error', 'db_error']:
+        overall_status_for_history = "error_checking_reco"
+        logger.warning(f"Error checking RECO for {member_name} ({reco_number}). Status: {reco_status_details.get('message', reco_status_details['status'])}")
+
+    history_entry = {
+        "name": member_name, "reco_number": reco_number, "wicket_status": "active", # Assuming all from Wicket are 'active' in Wicket
+        "reco_status_details": reco_status_details, # This contains status, source, last_checked from reco_api
+        "overall_status": overall_status_for_history
+    }
+    return history_entry, flagged_alert
+
+def resolve_reco_statuses(members, known_statuses):
+    """
+    Looks up the RECO numbers of members that known_statuses doesn't already cover.
+
+    Runs outside the caller's transaction: reco_api commits each cache write on its own short-lived
+    connection, so no write lock is held across a RECO API call. Successful lookups are added to
+    known_statuses. Returns (statuses, circuit_open_index): statuses maps every number in members to
+    its result (errors included), and circuit_open_index is the position in members of the first
+    lookup refused by the open circuit breaker (None if there was none). Lookups stop there.
+    """
+    statuses = {}
+    for position, member in enumerate(members):
+        reco_number = reco_api.normalize_reco_number(member.get("reco_number"))
+        if not reco_api.is_valid_reco_number(reco_number) or reco_number in statuses:
+            continue
+        if reco_number in known_statuses:
+            statuses[reco_number] = known_statuses[reco_number]
+            continue
+        reco_status_details = reco_api.get_license_status(member.get("wicket_reco_number", member.get("reco_number")))
+        if reco_status_details.get("source") == "circuit_open":
+            return statuses, position
+        statuses[reco_number] = reco_status_details
+        if reco_status_details['status'] not in ['error', 'db_error']:
+            known_statuses[reco_number] = reco_status_details
+    return statuses, None
+
+def dedupe_flagged_members(newly_flagged_for_notification):
+    """Keeps the first flagged entry per RECO number (members sharing a number are flagged once)."""
+    seen_reco_numbers = set()
+    deduped = []
+    for alert_obj in newly_flagged_for_notification:
+        if alert_obj["reco_number"] not in seen_reco_numbers:
+            seen_reco_numbers.add(alert_obj["reco_number"])
+            deduped.append(alert_obj)
+    return deduped
+
+def build_sweep_summary(total_wicket_members, processed_members_for_history, newly_flagged_for_notification, total_alerts_active, plan_stats=None):
+    summary = {
+        "total_wicket_members_processed": total_wicket_members,
+        "members_missing_reco": sum(1 for m in processed_members_for_history if m["reco_number"] == "MISSING"),
+        "members_invalid_reco": sum(1 for m in processed_members_for_history if m["overall_status"] == "invalid_reco"),
+        "members_ok": sum(1 for m in processed_members_for_history if m["overall_status"] == "ok"),
+        "members_flagged_this_run": len(newly_flagged_for_notification), # Count of members added/updated in alerts table in THIS run
+        "members_reco_check_error": sum(1 for m in processed_members_for_history if m["overall_status"] == "error_checking_reco"),
+        "total_alerts_active": total_alerts_active # Total number of alerts in the DB table
+    }
+    if plan_stats:
+        summary.update(plan_stats)
+    return summary
+
+def notify_flagged_members(newly_flagged_for_notification, conn):
+    """Sends notifications for a run's flagged members, committing or rolling back their status updates on conn."""
+    if newly_flagged_for_notification and not NOTIFICATIONS_ENABLED:
+        logger.warning(f"Notifications are disabled; {len(newly_flagged_for_notification)} flagged members were not notified.")
+    elif newly_flagged_for_notification:
+        logger.info(f"Attempting notifications for {len(newly_flagged_for_notification)} newly flagged members.")
+        from app.notifications import send_notification_for_lapsed_licenses_db
+        # Pass the DB connection to the notification function to use the same transaction context if needed,
+        # or let it handle its own connection. For simplicity, passing the connection.
+        notif_success, notif_message = send_notification_for_lapsed_licenses_db(newly_flagged_for_notification, conn)
+        if notif_success:
+            logger.info(f"Notification process completed: {notif_message}")
+            conn.commit() # Commit notification status updates
+        else:
+            logger.error(f"Notification process failed: {notif_message}")
+            conn.rollback() # Rollback notification status updates if sending failed but DB ops were attempted
+    else:
+        logger.info("No new/updated alerts requiring notification in this sweep.")
+
+def _sweep_error_outcome(message):
+    return {"timestamp": time.time(), "status": "error", "message": message, "summary": {}, "flagged_this_run": [], "all_processed_members": []}
+
+def _run_checkpointed_sweep(conn, run_id, owner):
+    """
+    Processes a sweep's members from its checkpoint cursor to the end, then finalizes the run.
+
+    Members are handled in chunks of SWEEP_CHECKPOINT_INTERVAL: the chunk's RECO lookups run first,
+    outside any transaction, then its alert changes, per-member results and the advanced cursor are
+    committed in one short transaction, so a crash loses at most one chunk of work and the write lock
+    is never held across a RECO API call. If the RECO circuit breaker opens, the sweep stops at that
+    member and is recorded as 'degraded' with the members checked so far.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT c.members, c.cursor, c.use_registry, c.plan_summary, r.run_timestamp FROM sweep_checkpoints c JOIN run_history r ON r.id = c.run_id WHERE c.run_id = ?", (run_id,))
+    checkpoint_row = cursor.fetchone()
+    active_wicket_members = json_codec.loads(checkpoint_row["members"])
+    current_time_sweep = checkpoint_row["run_timestamp"]
+    member_cursor = checkpoint_row["cursor"]
+    if member_cursor:
+        logger.info(f"Resuming sweep run {run_id} at member {member_cursor} of {len(active_wicket_members)}.")
+    known_statuses = {}
+    if checkpoint_row["use_registry"]:
+        known_statuses = reco_registry.lookup_registry_statuses(conn, [m.get("reco_number") for m in active_wicket_members[member_cursor:]])
+        conn.commit()
+
+    degraded = False
+    while member_cursor < len(active_wicket_members) and not degraded:
+        chunk_end = min(member_cursor + SWEEP_CHECKPOINT_INTERVAL, len(active_wicket_members))
+        chunk_statuses, circuit_open_index = resolve_reco_statuses(active_wicket_members[member_cursor:chunk_end], known_statuses)
+        if circuit_open_index is not None:
+            # That member was never actually checked; end the sweep there rather than fail every remaining lookup.
+            chunk_end = member_cursor + circuit_open_index
+            logger.warning(f"RECO API unavailable; ending sweep run {run_id} early at member {chunk_end} of {len(active_wicket_members)}.")
+            degraded = True
+        member_results = []
+        for member_index in range(member_cursor, chunk_end):
+            history_entry, flagged_alert = process_member_for_sweep(active_wicket_members[member_index], cursor, current_time_sweep, chunk_statuses)
+            member_results.append((run_id, member_index, json_codec.dumps(history_entry), json_codec.dumps(flagged_alert) if flagged_alert else None))
+        cursor.executemany("INSERT OR REPLACE INTO sweep_member_results (run_id, member_index, history_entry, flagged_alert) VALUES (?, ?, ?, ?)", member_results)
+        cursor.execute("UPDATE sweep_checkpoints SET cursor = ?, heartbeat_timestamp = ? WHERE run_id = ? AND owner = ?", (chunk_end, time.time(), run_id, owner))
+        if cursor.rowcount == 0:
+            # Another process resumed this run after deciding we were dead; let it finish.
+            conn.rollback()
+            logger.warning(f"Sweep run {run_id} was taken over by another process; stopping.")
+            return _sweep_error_outcome(f"Sweep run {run_id} was taken over by another process.")
+        conn.commit()
+        member_cursor = chunk_end
+        logger.info(f"Sweep run {run_id} checkpointed at {member_cursor}/{len(active_wicket_members)} members.")
+
+    newly_flagged_for_notification = []
+    processed_members_for_history = []
+    encoded_history_entries = []
+    cursor.execute("SELECT history_entry, flagged_alert FROM sweep_member_results WHERE run_id = ? ORDER BY member_index", (run_id,))
+    for result_row in cursor.fetchall():
+        encoded_history_entries.append(result_row["history_entry"])
+        processed_members_for_history.append(json_codec.loads(result_row["history_entry"]))
+        if result_row["flagged_alert"]:
+            newly_flagged_for_notification.append(json_codec.loads(result_row["flagged_alert"]))
+    newly_flagged_for_notification = dedupe_flagged_members(newly_flagged_for_notification)
+
+    cursor.execute("SELECT COUNT(*) FROM alerts")
+    current_alert_count_from_db = cursor.fetchone()[0]
+
+    plan_stats = json_codec.loads(checkpoint_row["plan_summary"]) if checkpoint_row["plan_summary"] else None
+    summary_obj = build_sweep_summary(len(active_wicket_members), processed_members_for_history, newly_flagged_for_notification, current_alert_count_from_db, plan_stats)
+    run_status, run_message = "completed", None
+    if degraded:
+        run_status = "degraded"
+        summary_obj["members_not_checked"] = len(active_wicket_members) - len(processed_members_for_history)
+        run_message = f"RECO API unavailable; {summary_obj['members_not_checked']} member(s) were not checked."
+    # The per-member entries are stored encoded already, so the history blob is joined rather than re-encoded.
+    cursor.execute("UPDATE run_history SET status = ?, message = ?, summary = ?, newly_flagged_members_count = ?, all_processed_members_details = ? WHERE id = ?",
+                   (run_status, run_message, json_codec.dumps(summary_obj), len(newly_flagged_for_notification), json_codec.join_encoded_array(encoded_history_entries), run_id))
+    cursor.execute("DELETE FROM sweep_member_results WHERE run_id = ?", (run_id,))
+    cursor.execute("DELETE FROM sweep_checkpoints WHERE run_id = ?", (run_id,))
+    conn.commit()
+
+    notify_flagged_members(newly_flagged_for_notification, conn)
+
+    run_outcome = get_last_run_results() # Fetch the full results of this run
+    # The 'flagged_this_run' key in run_outcome is for members who were *newly* flagged or re-flagged *in this specific run*.
+    # get_last_run_results() doesn't populate this; it's context for the current sweep.
+    run_outcome["flagged_this_run"] = newly_flagged_for_notification
+    return run_outcome
+
+def perform_license_validation_sweep(use_registry=None):
+    """
+    Runs a checkpointed sweep over all active Wicket members.
+
+    With use_registry (default: SWEEP_USE_RECO_REGISTRY) statuses are resolved from the imported
+    reco_registry table first and the RECO API is only called for numbers missing from it.
+    """
+    use_registry = reco_registry.SWEEP_USE_RECO_REGISTRY if use_registry is None else use_registry
     logger.info("Starting license validation sweep with SQLite backend...")
     conn = get_db_connection()
     # Initialize run_outcome to a default error state or a structure that get_last_run_results expects
-    run_outcome = {"timestamp": time.time(), "status": "error", "message": "Sweep did not complete.", "summary": {}, "flagged_this_run": [], "all_processed_members": []}
+    run_outcome = _sweep_error_outcome("Sweep did not complete.")
 
     try:
         active_wicket_members = wicket_api.get_active_members()
         current_time_sweep = time.time()
 
         if not active_wicket_members:
-            logger.warning("No active members from Wicket. Aborting sweep.")
-            run_data_tuple = (current_time_sweep, "aborted", "No active members from Wicket", json.dumps({}), 0, json.dumps([]))
+            abort_message = "Wicket API unavailable (circuit open)" if wicket_api.wicket_breaker.state == "open" else "No active members from Wicket"
+            logger.warning(f"{abort_message}. Aborting sweep.")
+            run_data_tuple = (current_time_sweep, "aborted", abort_message, json_codec.dumps({}), 0, json_codec.dumps([]))
             cursor = conn.cursor()
             cursor.execute("INSERT INTO run_history (run_timestamp, status, message, summary, newly_flagged_members_count, all_processed_members_details) VALUES (?, ?, ?, ?, ?, ?)", run_data_tuple)
             conn.commit()
@@ -96,121 +365,93 @@ def perform_license_validation_sweep():
             run_outcome = get_last_run_results()
             return run_outcome
 
-        newly_flagged_for_notification = []
-        processed_members_for_history = []
         cursor = conn.cursor()
+        # Earlier interrupted runs that nobody resumed are superseded by this fresh sweep.
+        cursor.execute("""
+            UPDATE run_history SET status = 'abandoned', message = 'Superseded by a newer sweep before it was resumed'
+            WHERE status = 'in_progress' AND id IN (SELECT run_id FROM sweep_checkpoints WHERE heartbeat_timestamp < ?)
+        """, (current_time_sweep - SWEEP_STALE_SECONDS,))
+        if cursor.rowcount > 0:
+            logger.info(f"Marked {cursor.rowcount} stale interrupted sweep(s) as abandoned.")
+        cursor.execute("DELETE FROM sweep_member_results WHERE run_id IN (SELECT id FROM run_history WHERE status = 'abandoned')")
+        cursor.execute("DELETE FROM sweep_checkpoints WHERE run_id IN (SELECT id FROM run_history WHERE status = 'abandoned')")
 
-        for member in active_wicket_members:
-            reco_number = member.get("reco_number")
-            member_name = member.get("name", "N/A")
-            overall_status_for_history = "ok"
-
-            if not reco_number:
-                logger.warning(f"Member {member_name} missing RECO. Skipping.")
-                processed_members_for_history.append({"name": member_name, "reco_number": "MISSING", "wicket_status": "active", "reco_status_details": {"status":"skipped"}, "overall_status": "skipped"})
-                continue
-
-            reco_status_details = reco_api.get_license_status(reco_number)
-
-            # This object is for the 'flagged_this_run' part of the response, and for notifications
-            alert_obj_for_notification = {
-                "name": member_name, "reco_number": reco_number,
-                "status_reported_by_reco": reco_status_details['status'],
-                "last_checked_reco": reco_status_details.get('last_checked', current_time_sweep),
-                "first_flagged_timestamp": current_time_sweep, # Default to now if new
-                "last_flagged_timestamp": current_time_sweep,
-                # notification_sent_timestamp and details will be added by notification logic
-            }
+        registry_statuses = reco_registry.lookup_registry_statuses(conn, [m.get("reco_number") for m in active_wicket_members]) if use_registry else None
+        planned_members, plan_stats = plan_sweep(active_wicket_members, conn, registry_statuses)
 
-            if reco_status_details['status'] not in ['active', 'error', 'db_error']:
-                overall_status_for_history = "flagged"
-                cursor.execute("SELECT id, first_flagged_timestamp, notification_sent_timestamp FROM alerts WHERE reco_number = ?", (reco_number,))
-                existing_alert_row = cursor.fetchone()
-                if existing_alert_row:
-                    alert_obj_for_notification["first_flagged_timestamp"] = existing_alert_row["first_flagged_timestamp"]
-                    # Reset notification status on re-flagging if it's a persistent issue.
-                    # Or, decide if you want to notify again based on time elapsed since last notification.
-                    # For now, if it's re-flagged, it becomes a candidate for notification again.
-                    cursor.execute("UPDATE alerts SET last_flagged_timestamp = ?, status_reported_by_reco = ?, last_checked_reco = ?, name = ?, notification_sent_timestamp = NULL, notification_details = NULL WHERE reco_number = ?",
-                                   (current_time_sweep, reco_status_details['status'], reco_status_details.get('last_checked'), member_name, reco_number))
-                else:
-                    cursor.execute("INSERT INTO alerts (reco_number, name, status_reported_by_reco, last_checked_reco, first_flagged_timestamp, last_flagged_timestamp) VALUES (?, ?, ?, ?, ?, ?)",
-                                   (reco_number, member_name, reco_status_details['status'], reco_status_details.get('last_checked'), current_time_sweep, current_time_sweep))
-                newly_flagged_for_notification.append(alert_obj_for_notification) # Add to list for current run's notifications
-
-            elif reco_status_details['status'] == 'active':
-                overall_status_for_history = "ok"
-                # If member is now active, remove any existing alert for them.
-                cursor.execute("DELETE FROM alerts WHERE reco_number = ?", (reco_number,))
-                if cursor.rowcount > 0: logger.info(f"Alert for RECO number {reco_number} ({member_name}) cleared as license is now active.")
-
-            elif reco_status_details['status'] in ['error', 'db_error']:
-                overall_status_for_history = "error_checking_reco"
-                logger.warning(f"Error checking RECO for {member_name} ({reco_number}). Status: {reco_status_details.get('message', reco_status_details['status'])}")
-
-            processed_members_for_history.append({
-                "name": member_name, "reco_number": reco_number, "wicket_status": "active", # Assuming all from Wicket are 'active' in Wicket
-                "reco_status_details": reco_status_details, # This contains status, source, last_checked from reco_api
-                "overall_status": overall_status_for_history
-            })
-
-        conn.commit() # Commit changes from alert processing
-
-        # Get count of all alerts currently in the DB for the summary
-        all_alerts_from_db = get_all_alerts() # This uses a new connection, consider passing cursor/conn if in one transaction
-        current_alert_count_from_db = len(all_alerts_from_db)
-
-        summary_obj = {
-            "total_wicket_members_processed": len(active_wicket_members),
-            "members_missing_reco": sum(1 for m in processed_members_for_history if m["reco_number"] == "MISSING"),
-            "members_ok": sum(1 for m in processed_members_for_history if m["overall_status"] == "ok"),
-            "members_flagged_this_run": len(newly_flagged_for_notification), # Count of members added/updated in alerts table in THIS run
-            "members_reco_check_error": sum(1 for m in processed_members_for_history if m["overall_status"] == "error_checking_reco"),
-            "total_alerts_active": current_alert_count_from_db # Total number of alerts in the DB table
-        }
-        cursor.execute("INSERT INTO run_history (run_timestamp, status, summary, newly_flagged_members_count, all_processed_members_details) VALUES (?, ?, ?, ?, ?)",
-                       (current_time_sweep, "completed", json.dumps(summary_obj), len(newly_flagged_for_notification), json.dumps(processed_members_for_history)))
+        owner = default_worker_id()
+        cursor.execute("INSERT INTO run_history (run_timestamp, status, newly_flagged_members_count) VALUES (?, ?, ?)", (current_time_sweep, "in_progress", 0))
+        run_id = cursor.lastrowid
+        cursor.execute("INSERT INTO sweep_checkpoints (run_id, members, cursor, owner, heartbeat_timestamp, use_registry, plan_summary, total_members) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                       (run_id, json_codec.dumps(planned_members), 0, owner, current_time_sweep, int(bool(use_registry)), json_codec.dumps(plan_stats), len(planned_members)))
         conn.commit()
 
-        if newly_flagged_for_notification:
-            logger.info(f"Attempting notifications for {len(newly_flagged_for_notification)} newly flagged members.")
-            # Pass the DB connection to the notification function to use the same transaction context if needed,
-            # or let it handle its own connection. For simplicity, passing the connection.
-            notif_success, notif_message = send_notification_for_lapsed_licenses_db(newly_flagged_for_notification, conn)
-            if notif_success:
-                logger.info(f"Notification process completed: {notif_message}")
-                conn.commit() # Commit notification status updates
-            else:
-                logger.error(f"Notification process failed: {notif_message}")
-                conn.rollback() # Rollback notification status updates if sending failed but DB ops were attempted
-        else:
-            logger.info("No new/updated alerts requiring notification in this sweep.")
-
-        run_outcome = get_last_run_results() # Fetch the full results of this run
-        # The 'flagged_this_run' key in run_outcome is for members who were *newly* flagged or re-flagged *in this specific run*.
-        # get_last_run_results() doesn't populate this; it's context for the current sweep.
-        run_outcome["flagged_this_run"] = newly_flagged_for_notification
-        return run_outcome
+        return _run_checkpointed_sweep(conn, run_id, owner)
 
     except sqlite3.Error as e:
         logger.error(f"SQLite error during license validation sweep: {e}", exc_info=True)
         if conn: conn.rollback()
         # Ensure run_outcome is structured like a normal result but indicates error
-        run_outcome = {"timestamp": time.time(), "status": "error", "message": f"Database error during sweep: {e}", "summary": {}, "flagged_this_run": [], "all_processed_members": []}
-        return run_outcome
+        return _sweep_error_outcome(f"Database error during sweep: {e}")
     except Exception as e_gen: # Catch any other unexpected errors
         logger.error(f"General error during license validation sweep: {e_gen}", exc_info=True)
         if conn: conn.rollback() # Rollback any partial DB changes
-        run_outcome = {"timestamp": time.time(), "status": "error", "message": f"General error during sweep: {e_gen}", "summary": {}, "flagged_this_run": [], "all_processed_members": []}
-        return run_outcome
+        return _sweep_error_outcome(f"General error during sweep: {e_gen}")
+    finally:
+        if conn: conn.close()
+
+def resume_license_validation_sweep(run_id=None, force=False):
+    """
+    Continues an interrupted sweep from its last checkpoint (the most recent one if run_id is None).
+
+    A run whose heartbeat is younger than SWEEP_STALE_SECONDS is assumed to still be running
+    somewhere and is left alone unless force is True.
+    """
+    resumable_run = get_resumable_run() if run_id is None else None
+    run_id = run_id if run_id is not None else (resumable_run["id"] if resumable_run else None)
+    if run_id is None:
+        return _sweep_error_outcome("No interrupted sweep to resume.")
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT owner, heartbeat_timestamp FROM sweep_checkpoints WHERE run_id = ?", (run_id,))
+        checkpoint_row = cursor.fetchone()
+        if not checkpoint_row:
+            return _sweep_error_outcome(f"Sweep run {run_id} has no checkpoint to resume from.")
+        if not force and time.time() - (checkpoint_row["heartbeat_timestamp"] or 0) < SWEEP_STALE_SECONDS:
+            return _sweep_error_outcome(f"Sweep run {run_id} is still running (owner {checkpoint_row['owner']}).")
+
+        # Compare-and-swap on the previous owner so two resume requests can't both take the run.
+        owner = default_worker_id()
+        cursor.execute("UPDATE sweep_checkpoints SET owner = ?, heartbeat_timestamp = ? WHERE run_id = ? AND owner IS ?",
+                       (owner, time.time(), run_id, checkpoint_row["owner"]))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return _sweep_error_outcome(f"Sweep run {run_id} was resumed by another process.")
+        conn.commit()
+
+        return _run_checkpointed_sweep(conn, run_id, owner)
+
+    except sqlite3.Error as e:
+        logger.error(f"SQLite error resuming license validation sweep {run_id}: {e}", exc_info=True)
+        if conn: conn.rollback()
+        return _sweep_error_outcome(f"Database error resuming sweep: {e}")
+    except Exception as e_gen:
+        logger.error(f"General error resuming license validation sweep {run_id}: {e_gen}", exc_info=True)
+        if conn: conn.rollback()
+        return _sweep_error_outcome(f"General error resuming sweep: {e_gen}")
     finally:
         if conn: conn.close()
 
 if __name__ == '__main__':
     init_db() # Ensure DB is initialized before running test
-    logger.info("Performing a license validation sweep with DB (from __main__)...")
-
-    sweep_results = perform_license_validation_sweep()
+    if get_resumable_run():
+        logger.info("Resuming interrupted license validation sweep with DB (from __main__)...")
+        sweep_results = resume_license_validation_sweep()
+    else:
+        logger.info("Performing a license validation sweep with DB (from __main__)...")
+        sweep_results = perform_license_validation_sweep()
 
     logger.info("\n--- Sweep Results Summary (from __main__) ---")
     logger.info(f"Timestamp: {time.ctime(sweep_results.get('timestamp', 0))}")
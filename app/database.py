@@ -2,6 +2,7 @@ import sqlite3
 import logging
 import time
 import json
+import os
 from pathlib import Path
 
 logging.basicConfig(level=logging.INFO)
@@ -9,14 +10,67 @@ logger = logging.getLogger(__name__)
 
 DB_DIR = Path(__file__).resolve().parent.parent / "instance"
 DB_FILE = DB_DIR / "mdc_app.sqlite3"
+# Sharded sweeps run several writer processes against the same file, so give
+# each connection a generous busy timeout instead of sqlite3's 5s default.
+DB_BUSY_TIMEOUT_SECONDS = float(os.environ.get("MDC_DB_BUSY_TIMEOUT", "30"))
+# Tables whose changes are counted in data_versions (by triggers) so the web tier can tell,
+# with one cheap query, whether anything it rendered before has changed.
+VERSIONED_TABLES = ("alerts", "run_history")
+# The events table feeds the /events SSE stream; only the newest rows are kept.
+EVENTS_RETAINED = int(os.environ.get("MDC_EVENTS_RETAINED", "5000"))
+
+# Triggers that append UI events whenever the underlying rows change, whichever process writes them.
+EVENT_TRIGGERS = {
+    "alerts_insert_event": "AFTER INSERT ON alerts BEGIN INSERT INTO events (event_type, payload, created_timestamp) VALUES ('alert_flagged', json_object('reco_number', NEW.reco_number), CAST(strftime('%s', 'now') AS INTEGER)); END",
+    "alerts_update_event": "AFTER UPDATE ON alerts BEGIN INSERT INTO events (event_type, payload, created_timestamp) VALUES ('alert_updated', json_object('reco_number', NEW.reco_number), CAST(strftime('%s', 'now') AS INTEGER)); END",
+    "alerts_delete_event": "AFTER DELETE ON alerts BEGIN INSERT INTO events (event_type, payload, created_timestamp) VALUES ('alert_cleared', json_object('reco_number', OLD.reco_number), CAST(strftime('%s', 'now') AS INTEGER)); END",
+    "sweep_checkpoints_progress_event": "AFTER UPDATE OF cursor ON sweep_checkpoints BEGIN INSERT INTO events (event_type, payload, created_timestamp) VALUES ('sweep_progress', json_object('run_id', NEW.run_id, 'processed', NEW.cursor, 'total', NEW.total_members), CAST(strftime('%s', 'now') AS INTEGER)); END",
+    "sweep_shards_progress_event": "AFTER UPDATE OF status ON sweep_shards WHEN NEW.status = 'done' BEGIN INSERT INTO events (event_type, payload, created_timestamp) VALUES ('sweep_progress', json_object('sweep_id', NEW.sweep_id, 'shards_done', (SELECT COUNT(*) FROM sweep_shards WHERE sweep_id = NEW.sweep_id AND status = 'done'), 'shards_total', (SELECT COUNT(*) FROM sweep_shards WHERE sweep_id = NEW.sweep_id)), CAST(strftime('%s', 'now') AS INTEGER)); END",
+    "run_history_finished_event": "AFTER UPDATE OF status ON run_history WHEN NEW.status NOT IN ('in_progress') BEGIN INSERT INTO events (event_type, payload, created_timestamp) VALUES ('run_finished', json_object('run_id', NEW.id, 'status', NEW.status), CAST(strftime('%s', 'now') AS INTEGER)); END",
+    "run_history_insert_event": "AFTER INSERT ON run_history WHEN NEW.status NOT IN ('in_progress') BEGIN INSERT INTO events (event_type, payload, created_timestamp) VALUES ('run_finished', json_object('run_id', NEW.id, 'status', NEW.status), CAST(strftime('%s', 'now') AS INTEGER)); END",
+    "events_prune": f"AFTER INSERT ON events BEGIN DELETE FROM events WHERE id <= NEW.id - {EVENTS_RETAINED}; END",
+}
+
+# One-off data migrations run by init_db(), tracked with PRAGMA user_version; bump when adding one.
+SCHEMA_VERSION = 2
+
+def _migrate_legacy_alert_keys(cursor):
+    """
+    Re-keys alerts written before RECO numbers were normalized (they're keyed by the raw Wicket value,
+    possibly with whitespace or lower case), or drops them if an alert under the normalized number
+    already exists, so sweeps update and clear them.
+    """
+    stored_reco_numbers = [row[0] for row in cursor.execute("SELECT reco_number FROM alerts").fetchall()]
+    if not stored_reco_numbers:
+        return
+    # Imported here because reco_api imports this module.
+    from app.integrations.reco_api import normalize_reco_number
+    for stored_reco_number in stored_reco_numbers:
+        normalized = normalize_reco_number(stored_reco_number)
+        if normalized and normalized != stored_reco_number:
+            cursor.execute("UPDATE OR IGNORE alerts SET reco_number = ? WHERE reco_number = ?", (normalized, stored_reco_number))
+            cursor.execute("DELETE FROM alerts WHERE reco_number = ?", (stored_reco_number,))
+            logger.info(f"Re-keyed alert '{stored_reco_number}' to normalized RECO number '{normalized}'.")
+
+def _migrate_checkpoint_total_members(cursor):
+    """Adds sweep_checkpoints.total_members (so progress events don't re-parse the member snapshot) and its trigger."""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(sweep_checkpoints)").fetchall()]
+    if "total_members" not in columns:
+        cursor.execute("ALTER TABLE sweep_checkpoints ADD COLUMN total_members INTEGER")
+    cursor.execute("UPDATE sweep_checkpoints SET total_members = json_array_length(members) WHERE total_members IS NULL")
+    cursor.execute("DROP TRIGGER IF EXISTS sweep_checkpoints_progress_event")
+    cursor.execute(f"CREATE TRIGGER sweep_checkpoints_progress_event {EVENT_TRIGGERS['sweep_checkpoints_progress_event']}")
 
 def init_db(db_path=None):
     path_to_use = db_path if db_path else DB_FILE
     DB_DIR.mkdir(parents=True, exist_ok=True)
     conn = None
     try:
-        conn = sqlite3.connect(path_to_use)
+        conn = sqlite3.connect(path_to_use, timeout=DB_BUSY_TIMEOUT_SECONDS)
         cursor = conn.cursor()
+        # WAL lets shard workers read while another worker holds the write lock. It relies on shared
+        # memory, so every process using this file must run on the same host (not over a network filesystem).
+        cursor.execute("PRAGMA journal_mode=WAL")
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS reco_cache (
             reco_number TEXT PRIMARY KEY,
@@ -26,6 +80,16 @@ def init_db(db_path=None):
         )
         ''')
         cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reco_registry (
+            reco_number TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            status_description TEXT,
+            name TEXT,
+            imported_timestamp INTEGER NOT NULL,
+            source_file TEXT
+        )
+        ''')
+        cursor.execute('''
         CREATE TABLE IF NOT EXISTS alerts (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             reco_number TEXT NOT NULL,
@@ -39,6 +103,8 @@ def init_db(db_path=None):
             UNIQUE(reco_number)
         )
         ''')
+        # The alerts table and export are ordered by this; the index lets them stream without a sort.
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_last_flagged ON alerts (last_flagged_timestamp)")
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS run_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -50,6 +116,99 @@ def init_db(db_path=None):
             all_processed_members_details TEXT
         )
         ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sweep_checkpoints (
+            run_id INTEGER PRIMARY KEY,
+            members TEXT NOT NULL,
+            cursor INTEGER NOT NULL,
+            owner TEXT,
+            heartbeat_timestamp INTEGER,
+            use_registry INTEGER NOT NULL DEFAULT 0,
+            plan_summary TEXT,
+            total_members INTEGER
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sweep_member_results (
+            run_id INTEGER NOT NULL,
+            member_index INTEGER NOT NULL,
+            history_entry TEXT NOT NULL,
+            flagged_alert TEXT,
+            PRIMARY KEY (run_id, member_index)
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sharded_sweeps (
+            sweep_id TEXT PRIMARY KEY,
+            created_timestamp INTEGER NOT NULL,
+            shard_count INTEGER NOT NULL,
+            total_members INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            run_history_id INTEGER,
+            plan_summary TEXT
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sweep_shards (
+            sweep_id TEXT NOT NULL,
+            shard_index INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            members TEXT NOT NULL,
+            lease_owner TEXT,
+            lease_expires INTEGER,
+            started_timestamp INTEGER,
+            finished_timestamp INTEGER,
+            processed_members_details TEXT,
+            flagged_members TEXT,
+            degraded INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (sweep_id, shard_index)
+        )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sweep_shards_status ON sweep_shards (sweep_id, status)")
+        # Circuit breaker state, shared by the web process, the CLI and every shard worker.
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS circuit_breakers (
+            name TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            opened_at REAL,
+            trial_in_flight INTEGER NOT NULL DEFAULT 0,
+            outcomes TEXT NOT NULL DEFAULT '',
+            updated_timestamp REAL NOT NULL
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_timestamp INTEGER NOT NULL
+        )
+        ''')
+        for table_name in VERSIONED_TABLES:
+            cursor.execute("INSERT OR IGNORE INTO data_versions (name, version, updated_timestamp) VALUES (?, 0, CAST(strftime('%s', 'now') AS INTEGER))", (table_name,))
+            for operation in ("INSERT", "UPDATE", "DELETE"):
+                cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table_name}_{operation.lower()}_version AFTER {operation} ON {table_name}
+                BEGIN
+                    UPDATE data_versions SET version = version + 1, updated_timestamp = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = '{table_name}';
+                END
+                ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT NOT NULL,
+            payload TEXT,
+            created_timestamp INTEGER NOT NULL
+        )
+        ''')
+        for trigger_name, trigger_body in EVENT_TRIGGERS.items():
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {trigger_name} {trigger_body}")
+        schema_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version < 1:
+            _migrate_legacy_alert_keys(cursor)
+        if schema_version < 2:
+            _migrate_checkpoint_total_members(cursor)
+        if schema_version < SCHEMA_VERSION:
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         conn.commit()
         logger.info(f"Database initialized/verified successfully at {path_to_use}.")
     except sqlite3.Error as e:
@@ -63,13 +222,25 @@ def get_db_connection(db_path=None):
     path_to_use = db_path if db_path else DB_FILE
     conn = None
     try:
-        conn = sqlite3.connect(path_to_use)
+        conn = sqlite3.connect(path_to_use, timeout=DB_BUSY_TIMEOUT_SECONDS)
         conn.row_factory = sqlite3.Row
         return conn
     except sqlite3.Error as e:
         logger.error(f"SQLite error connecting to database: {e}")
         raise
 
+def get_data_versions(names, db_conn_passed=None):
+    """Returns {name: (version, updated_timestamp)} for the requested VERSIONED_TABLES."""
+    conn_provided = bool(db_conn_passed)
+    conn = db_conn_passed if conn_provided else get_db_connection()
+    try:
+        placeholders = ", ".join("?" for _ in names)
+        rows = conn.execute(f"SELECT name, version, updated_timestamp FROM data_versions WHERE name IN ({placeholders})", tuple(names)).fetchall()
+        return {row["name"]: (row["version"], row["updated_timestamp"]) for row in rows}
+    finally:
+        if not conn_provided and conn:
+            conn.close()
+
 if __name__ == '__main__':
     print(f"Initializing database at: {DB_FILE}")
     init_db()
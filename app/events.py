@@ -0,0 +1,63 @@
+import os
+import logging
+from app.database import get_db_connection
+from app import json_codec
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Events are written by triggers (see database.EVENT_TRIGGERS); the SSE stream polls for new ones.
+SSE_POLL_SECONDS = float(os.environ.get("SSE_POLL_SECONDS", "1"))
+SSE_KEEPALIVE_SECONDS = float(os.environ.get("SSE_KEEPALIVE_SECONDS", "15"))
+# Streams are closed after this long so a worker isn't pinned forever; EventSource reconnects with Last-Event-ID.
+SSE_MAX_STREAM_SECONDS = float(os.environ.get("SSE_MAX_STREAM_SECONDS", "300"))
+SSE_BATCH_LIMIT = int(os.environ.get("SSE_BATCH_LIMIT", "500"))
+
+def get_latest_event_id(db_conn_passed=None):
+    conn_provided = bool(db_conn_passed)
+    conn = db_conn_passed if conn_provided else get_db_connection()
+    try:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+    finally:
+        if not conn_provided and conn:
+            conn.close()
+
+def get_oldest_event_id(db_conn_passed=None):
+    conn_provided = bool(db_conn_passed)
+    conn = db_conn_passed if conn_provided else get_db_connection()
+    try:
+        return conn.execute("SELECT COALESCE(MIN(id), 0) FROM events").fetchone()[0]
+    finally:
+        if not conn_provided and conn:
+            conn.close()
+
+def get_events_after(last_event_id, limit=None, db_conn_passed=None):
+    """Returns events with id > last_event_id, oldest first, with their JSON payloads decoded."""
+    conn_provided = bool(db_conn_passed)
+    conn = db_conn_passed if conn_provided else get_db_connection()
+    try:
+        rows = conn.execute("SELECT id, event_type, payload, created_timestamp FROM events WHERE id > ? ORDER BY id LIMIT ?",
+                            (last_event_id, limit or SSE_BATCH_LIMIT)).fetchall()
+        events = []
+        for row in rows:
+            event = dict(row)
+            try:
+                event["payload"] = json_codec.loads(event["payload"]) if event["payload"] else {}
+            except json_codec.JSONDecodeError:
+                logger.warning(f"Could not parse payload JSON for event ID {event['id']}")
+                event["payload"] = {}
+            events.append(event)
+        return events
+    finally:
+        if not conn_provided and conn:
+            conn.close()
+
+def format_sse(event_name, data, event_id=None):
+    """Formats one Server-Sent Events message; multi-line data is split across data: lines."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_name}")
+    for data_line in (data or "").splitlines() or [""]:
+        lines.append(f"data: {data_line}")
+    return "\n".join(lines) + "\n\n"
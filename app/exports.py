@@ -0,0 +1,125 @@
+import io
+import csv
+import zlib
+import logging
+import datetime
+from app.database import get_db_connection
+from app import json_codec
+from app.filters import alert_where_clause, run_result_where_clause
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+RESULT_EXPORT_COLUMNS = ["name", "reco_number", "wicket_status", "reco_status", "reco_source", "reco_last_checked", "overall_status"]
+ALERT_EXPORT_COLUMNS = ["reco_number", "name", "status_reported_by_reco", "last_checked_reco", "first_flagged_timestamp", "last_flagged_timestamp", "notification_sent_timestamp"]
+TIMESTAMP_COLUMNS = {"reco_last_checked", "last_checked_reco", "first_flagged_timestamp", "last_flagged_timestamp", "notification_sent_timestamp"}
+# Rows are buffered up to roughly this many bytes before a chunk is handed to the WSGI server.
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_FETCH_SIZE = 500
+
+def get_exportable_run_id(run_id=None):
+    """Returns run_id if that run finished (completed or degraded), the latest finished run if run_id is None, else None."""
+    conn = get_db_connection()
+    try:
+        if run_id is not None:
+            row = conn.execute("SELECT id FROM run_history WHERE id = ? AND status IN ('completed', 'degraded')", (run_id,)).fetchone()
+        else:
+            row = conn.execute("SELECT id FROM run_history WHERE status IN ('completed', 'degraded') ORDER BY run_timestamp DESC LIMIT 1").fetchone()
+        return row["id"] if row else None
+    finally:
+        conn.close()
+
+def _iter_cursor_rows(sql, params):
+    # The connection lives inside the generator so it's opened on first read and closed when the
+    # response finishes (or the client disconnects and the WSGI server closes the iterator).
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+def iter_run_result_rows(run_id, filters):
+    """
+    Streams one run's processed members as flat dicts.
+
+    The members are stored as a single JSON array in run_history; json_each() walks it inside SQLite,
+    so filtering happens there and Python only holds a fetchmany() batch of rows at a time. SQLite itself
+    still reads the whole blob into memory (memory stays proportional to one run, not constant). json_each()
+    already yields elements in array order, so there's no ORDER BY (it would sort every row before the first one is sent).
+    """
+    where_sql, where_params = run_result_where_clause(filters)
+    sql = f"""
+        SELECT json_extract(value, '$.name') AS name,
+               json_extract(value, '$.reco_number') AS reco_number,
+               json_extract(value, '$.wicket_status') AS wicket_status,
+               json_extract(value, '$.reco_status_details.status') AS reco_status,
+               json_extract(value, '$.reco_status_details.source') AS reco_source,
+               json_extract(value, '$.reco_status_details.last_checked') AS reco_last_checked,
+               json_extract(value, '$.overall_status') AS overall_status
+        FROM json_each((SELECT all_processed_members_details FROM run_history WHERE id = ?))
+        {where_sql}
+    """
+    return _iter_cursor_rows(sql, [run_id] + where_params)
+
+def iter_alert_rows(filters):
+    where_sql, where_params = alert_where_clause(filters)
+    sql = f"SELECT {', '.join(ALERT_EXPORT_COLUMNS)} FROM alerts{where_sql} ORDER BY last_flagged_timestamp DESC"
+    return _iter_cursor_rows(sql, where_params)
+
+def _format_timestamps(row):
+    for column in TIMESTAMP_COLUMNS.intersection(row):
+        if isinstance(row[column], (int, float)):
+            row[column] = datetime.datetime.fromtimestamp(row[column]).isoformat(timespec="seconds")
+    return row
+
+def iter_csv(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(_format_timestamps(row))
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def iter_ndjson(rows, columns):
+    chunk = []
+    chunk_size = 0
+    for row in rows:
+        row = _format_timestamps(row)
+        line = json_codec.dumps({column: row.get(column) for column in columns}, default=str) + "\n"
+        chunk.append(line)
+        chunk_size += len(line)
+        if chunk_size >= EXPORT_CHUNK_BYTES:
+            yield "".join(chunk).encode("utf-8")
+            chunk.clear()
+            chunk_size = 0
+    if chunk:
+        yield "".join(chunk).encode("utf-8")
+
+def iter_encoded(rows, columns, export_format):
+    """Streams rows as UTF-8 CSV or NDJSON byte chunks."""
+    if export_format == "csv":
+        return iter_csv(rows, columns)
+    if export_format == "ndjson":
+        return iter_ndjson(rows, columns)
+    raise ValueError(f"Unsupported export format: {export_format}")
+
+def iter_gzip(chunks):
+    """Gzips a stream of byte chunks incrementally (wbits=31 selects the gzip container)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
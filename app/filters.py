@@ -0,0 +1,61 @@
+# Filter query parameters shared by the dashboard partials (/results, /alerts) and the exports.
+
+RESULT_STATUSES = ("ok", "flagged", "error_checking_reco", "skipped", "invalid_reco")
+ALERT_STATUSES = ("inactive", "not_found")
+
+def parse_filters(args):
+    """
+    Reads 'status', 'q' (name / RECO number substring) and 'notified' ('yes' / 'no', alerts only)
+    from a request's query args. Missing or blank values become None.
+    """
+    notified = (args.get("notified") or "").strip().lower()
+    return {
+        "status": (args.get("status") or "").strip() or None,
+        "q": (args.get("q") or "").strip() or None,
+        "notified": notified if notified in ("yes", "no") else None,
+    }
+
+def has_filters(filters):
+    return any(filters.values())
+
+def _like_pattern(text):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def alert_where_clause(filters):
+    """Returns (sql, params) for filtering the alerts table; sql is '' or starts with ' WHERE'."""
+    conditions = []
+    params = []
+    if filters.get("status"):
+        conditions.append("status_reported_by_reco = ?")
+        params.append(filters["status"])
+    if filters.get("q"):
+        conditions.append("(name LIKE ? ESCAPE '\\' OR reco_number LIKE ? ESCAPE '\\')")
+        params.extend([_like_pattern(filters["q"])] * 2)
+    if filters.get("notified") == "yes":
+        conditions.append("notification_sent_timestamp IS NOT NULL")
+    elif filters.get("notified") == "no":
+        conditions.append("notification_sent_timestamp IS NULL")
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+def run_result_where_clause(filters, value_column="value"):
+    """Returns (sql, params) filtering json_each() rows of a run's processed-members blob."""
+    conditions = []
+    params = []
+    if filters.get("status"):
+        conditions.append(f"json_extract({value_column}, '$.overall_status') = ?")
+        params.append(filters["status"])
+    if filters.get("q"):
+        conditions.append(f"(json_extract({value_column}, '$.name') LIKE ? ESCAPE '\\' OR json_extract({value_column}, '$.reco_number') LIKE ? ESCAPE '\\')")
+        params.extend([_like_pattern(filters["q"])] * 2)
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+def processed_member_matches(member, filters):
+    """Python equivalent of run_result_where_clause for an already-decoded history entry."""
+    if filters.get("status") and member.get("overall_status") != filters["status"]:
+        return False
+    if filters.get("q"):
+        needle = filters["q"].lower()
+        if needle not in str(member.get("name", "")).lower() and needle not in str(member.get("reco_number", "")).lower():
+            return False
+    return True
@@ -0,0 +1,167 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from collections import deque
+from app.database import get_db_connection
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+# Breaker reads and writes are tiny, so don't let one stall an API call for the full DB busy timeout.
+BREAKER_DB_TIMEOUT_SECONDS = float(os.environ.get("BREAKER_DB_TIMEOUT_SECONDS", "2"))
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker for one upstream API.
+
+    Closed: calls go through and outcomes are recorded in a sliding window of the last window_size calls.
+    Once at least minimum_calls are recorded and the failure rate reaches failure_rate_threshold, the
+    breaker opens and callers should fail fast. After open_seconds a single trial call is let through
+    (half-open); its success closes the breaker, its failure opens it again. A trial that never reports
+    back (its process died) is given up on after another open_seconds.
+
+    With shared=True the state lives in the circuit_breakers table, so the web process, the CLI and every
+    shard worker see one breaker (and the health panel shows what sweeps actually hit). Each operation
+    loads and saves the row in one short transaction; if the database can't be used, the breaker keeps
+    working on its in-process state.
+    """
+
+    def __init__(self, name, failure_rate_threshold=0.5, window_size=20, minimum_calls=10, open_seconds=60, shared=True):
+        self.name = name
+        self.shared = shared
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self._outcomes = deque(maxlen=window_size)
+        self._state = STATE_CLOSED
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self._store_warned = False
+
+    @contextmanager
+    def _synced(self, write=False):
+        """Holds the in-process lock and, for a shared breaker, loads the stored state (and saves it afterwards if write)."""
+        with self._lock:
+            conn = None
+            if self.shared:
+                try:
+                    conn = get_db_connection()
+                    conn.execute(f"PRAGMA busy_timeout = {int(BREAKER_DB_TIMEOUT_SECONDS * 1000)}")
+                    if write:
+                        conn.execute("BEGIN IMMEDIATE")
+                    row = conn.execute("SELECT state, opened_at, trial_in_flight, outcomes FROM circuit_breakers WHERE name = ?", (self.name,)).fetchone()
+                    if row:
+                        self._state, self._opened_at, self._trial_in_flight = row["state"], row["opened_at"], bool(row["trial_in_flight"])
+                        self._outcomes.clear()
+                        self._outcomes.extend(outcome == "1" for outcome in row["outcomes"])
+                except sqlite3.Error as e:
+                    self._store_failed(conn, e)
+                    conn = None
+            try:
+                yield
+            finally:
+                if conn:
+                    try:
+                        if write:
+                            conn.execute('''
+                                INSERT INTO circuit_breakers (name, state, opened_at, trial_in_flight, outcomes, updated_timestamp)
+                                VALUES (?, ?, ?, ?, ?, ?)
+                                ON CONFLICT(name) DO UPDATE SET
+                                state = excluded.state, opened_at = excluded.opened_at, trial_in_flight = excluded.trial_in_flight,
+                                outcomes = excluded.outcomes, updated_timestamp = excluded.updated_timestamp
+                            ''', (self.name, self._state, self._opened_at, int(self._trial_in_flight),
+                                  "".join("1" if outcome else "0" for outcome in self._outcomes), time.time()))
+                            conn.commit()
+                    except sqlite3.Error as e:
+                        self._store_failed(conn, e)
+                    finally:
+                        conn.close()
+
+    def _store_failed(self, conn, error):
+        if conn:
+            conn.rollback()
+            conn.close()
+        if not self._store_warned:
+            logger.warning(f"Circuit '{self.name}' state can't be shared through the database ({error}); using this process's state.")
+            self._store_warned = True
+
+    @property
+    def state(self):
+        with self._synced():
+            self._maybe_half_open(announce=False)
+            return self._state
+
+    def _maybe_half_open(self, announce=True):
+        # Read-only callers (state, snapshot) see the transition without logging it; it's logged when saved.
+        if self._state == STATE_OPEN and time.time() - self._opened_at >= self.open_seconds:
+            self._state = STATE_HALF_OPEN
+            self._trial_in_flight = False
+            if announce:
+                logger.info(f"Circuit '{self.name}' half-open; allowing a trial request.")
+        elif self._state == STATE_HALF_OPEN and self._trial_in_flight and time.time() - self._opened_at >= self.open_seconds:
+            self._trial_in_flight = False
+            if announce:
+                logger.warning(f"Circuit '{self.name}' trial request never reported back; allowing another.")
+
+    def allow_request(self):
+        """Returns True if the caller may contact the upstream now."""
+        with self._synced(write=True):
+            self._maybe_half_open()
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._opened_at = time.time()
+                return True
+            return False
+
+    def record_success(self):
+        with self._synced(write=True):
+            if self._state == STATE_HALF_OPEN:
+                logger.info(f"Circuit '{self.name}' closed after a successful trial request.")
+                self._state = STATE_CLOSED
+                self._outcomes.clear()
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        with self._synced(write=True):
+            if self._state == STATE_HALF_OPEN:
+                self._open()
+                return
+            self._outcomes.append(False)
+            if self._state == STATE_CLOSED and len(self._outcomes) >= self.minimum_calls:
+                failure_rate = self._outcomes.count(False) / len(self._outcomes)
+                if failure_rate >= self.failure_rate_threshold:
+                    self._open()
+
+    def _open(self):
+        self._state = STATE_OPEN
+        self._opened_at = time.time()
+        self._trial_in_flight = False
+        logger.warning(f"Circuit '{self.name}' opened; failing fast for {self.open_seconds}s.")
+
+    def seconds_until_retry(self):
+        with self._synced():
+            if self._state != STATE_OPEN:
+                return 0
+            return max(0, int(self.open_seconds - (time.time() - self._opened_at)))
+
+    def snapshot(self):
+        """State summary for health displays."""
+        with self._synced():
+            self._maybe_half_open(announce=False)
+            failures = self._outcomes.count(False)
+            return {
+                "name": self.name,
+                "state": self._state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": failures,
+                "retry_in_seconds": max(0, int(self.open_seconds - (time.time() - self._opened_at))) if self._state == STATE_OPEN else 0,
+            }
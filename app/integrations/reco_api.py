@@ -1,10 +1,12 @@
 import os
+import re
 import requests
 import logging
 import time
-import json
 import sqlite3
 from app.database import get_db_connection, init_db
+from app import json_codec
+from app.integrations.circuit_breaker import CircuitBreaker
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,6 +14,19 @@ logger = logging.getLogger(__name__)
 RECO_API_BASE_URL = os.environ.get("RECO_API_BASE_URL", "https://api.reco.on.ca/registrantsearch/api/v2/registrants")
 RECO_API_KEY = os.environ.get("RECO_API_KEY")
 CACHE_EXPIRY_SECONDS = 24 * 60 * 60
+RECO_API_TIMEOUT_SECONDS = float(os.environ.get("RECO_API_TIMEOUT_SECONDS", "15"))
+# Applied to normalized numbers; anything else is reported as invalid without an API call.
+RECO_NUMBER_PATTERN = re.compile(os.environ.get("RECO_NUMBER_PATTERN", r"^[A-Z0-9]{1,20}$"))
+
+# Shared by every lookup in every process (state is kept in the database). While open, lookups that miss the cache fail fast
+# with source 'circuit_open' instead of each waiting out the request timeout.
+reco_breaker = CircuitBreaker(
+    "reco",
+    failure_rate_threshold=float(os.environ.get("RECO_BREAKER_FAILURE_RATE", "0.5")),
+    window_size=int(os.environ.get("RECO_BREAKER_WINDOW", "20")),
+    minimum_calls=int(os.environ.get("RECO_BREAKER_MIN_CALLS", "10")),
+    open_seconds=int(os.environ.get("RECO_BREAKER_OPEN_SECONDS", "60")),
+)
 
 try:
     conn_test = get_db_connection()
@@ -25,11 +40,45 @@ except Exception as e:
     logger.error(f"Failed to check reco_cache, attempting init_db(): {e}")
     init_db()
 
-def get_license_status(reco_number: str):
+def normalize_reco_number(reco_number):
+    """
+    Canonical form used for deduping, as the cache/alert key and as the value sent to RECO: whitespace
+    removed and upper-cased. Leading zeros are kept, since RECO treats '012345' and '12345' as
+    different registration numbers.
+    """
+    if reco_number is None:
+        return None
+    return re.sub(r"\s+", "", str(reco_number)).upper() or None
+
+def is_valid_reco_number(normalized_reco_number):
+    return bool(normalized_reco_number and RECO_NUMBER_PATTERN.match(normalized_reco_number))
+
+INACTIVE_STATUS_TERMS = {"inactive", "terminated", "expired", "suspended"}
+
+def status_from_description(status_description, reco_number=None, log_unrecognized=True):
+    """
+    Maps a RECO registrant statusDescription to the app's 'active' / 'inactive' / 'not_found' statuses.
+
+    Whole words are matched and the inactive terms win, so 'Inactive' or 'Active - Suspended' are never
+    read as active. Anything unrecognized (including an empty description) is 'not_found'.
+    """
+    api_status_str = (status_description or "").lower()
+    status_words = set(re.findall(r"[a-z]+", api_status_str))
+    if status_words & INACTIVE_STATUS_TERMS: return "inactive"
+    if "active" in status_words: return "active"
+    if log_unrecognized:
+        logger.warning(f"Unrecognized status '{api_status_str}' for {reco_number}")
+    return "not_found"
+
+def get_license_status(reco_number: str, db_conn_passed=None):
+    reco_number = normalize_reco_number(reco_number)
     if not reco_number:
         return {'status': 'error', 'message': 'RECO number cannot be empty', 'last_checked': time.time(), 'source': 'internal'}
 
-    conn = get_db_connection()
+    # When the caller passes its connection (a sharded sweep worker), the cache write joins the caller's
+    # transaction and is committed with that member's alert changes; otherwise it's committed right away.
+    conn_provided = bool(db_conn_passed)
+    conn = db_conn_passed if conn_provided else get_db_connection()
     cursor = conn.cursor()
     current_time = time.time()
 
@@ -44,11 +93,15 @@ def get_license_status(reco_number: str):
                     'status': cached_row['status'],
                     'last_checked': cached_row['timestamp'],
                     'source': 'cache',
-                    'raw_response': json.loads(cached_row['raw_response']) if cached_row['raw_response'] else None
+                    'raw_response': json_codec.lazy_loads(cached_row['raw_response'], label=f"cached RECO response for {reco_number}")
                 }
             else:
                 logger.info(f"RECO {reco_number} in cache but expired.")
 
+        if not reco_breaker.allow_request():
+            logger.warning(f"RECO API circuit open; not looking up {reco_number}.")
+            return {'status': 'error', 'message': f'RECO API unavailable (circuit open, retry in {reco_breaker.seconds_until_retry()}s)', 'last_checked': current_time, 'source': 'circuit_open'}
+
         logger.info(f"Fetching status for RECO {reco_number} from API.")
         status_from_api = 'error'
         api_response_data = None
@@ -59,23 +112,17 @@ def get_license_status(reco_number: str):
         try:
             params = {"registrationNumber": reco_number}
             # Ensure requests is imported: import requests
-            response = requests.get(RECO_API_BASE_URL, headers=headers, params=params, timeout=15)
+            response = requests.get(RECO_API_BASE_URL, headers=headers, params=params, timeout=RECO_API_TIMEOUT_SECONDS)
             response.raise_for_status()
             api_response_data = response.json()
 
             # Placeholder parsing logic from original function (adjust if needed)
             if isinstance(api_response_data, list) and len(api_response_data) > 0:
                 registrant_info = api_response_data[0]
-                api_status_str = registrant_info.get("statusDescription", "").lower()
-                if "active" in api_status_str: status_from_api = "active"
-                elif any(s in api_status_str for s in ["terminated", "expired", "suspended"]): status_from_api = "inactive"
-                else: status_from_api = "not_found"; logger.warning(f"Unrecognized status '{api_status_str}' for {reco_number}")
+                status_from_api = status_from_description(registrant_info.get("statusDescription", ""), reco_number)
             elif isinstance(api_response_data, dict) and api_response_data.get("items") is not None and len(api_response_data["items"]) > 0:
                 registrant_info = api_response_data["items"][0]
-                api_status_str = registrant_info.get("statusDescription", "").lower()
-                if "active" in api_status_str: status_from_api = "active"
-                elif any(s in api_status_str for s in ["terminated", "expired", "suspended"]): status_from_api = "inactive"
-                else: status_from_api = "not_found"; logger.warning(f"Unrecognized status '{api_status_str}' for {reco_number}")
+                status_from_api = status_from_description(registrant_info.get("statusDescription", ""), reco_number)
             else: status_from_api = "not_found"
             # End of placeholder parsing logic
             logger.info(f"RECO API response for {reco_number}: Status '{status_from_api}'")
@@ -88,7 +135,13 @@ def get_license_status(reco_number: str):
         except ValueError as e:
             status_from_api = "error"; logger.error(f"Error decoding JSON for {reco_number}: {e}"); api_response_data = {"error": "Invalid JSON response"}
 
-        raw_response_str = json.dumps(api_response_data) if api_response_data is not None else None
+        if status_from_api == "error":
+            reco_breaker.record_failure()
+            # Don't cache failures: they'd replace a good (if expired) entry and pin the error for a day.
+            return {'status': 'error', 'message': f"RECO API error: {api_response_data.get('error') if api_response_data else 'unknown'}", 'last_checked': current_time, 'source': 'api', 'raw_response': api_response_data}
+        reco_breaker.record_success()
+
+        raw_response_str = json_codec.dumps(api_response_data) if api_response_data is not None else None
         cursor.execute('''
             INSERT INTO reco_cache (reco_number, status, timestamp, raw_response)
             VALUES (?, ?, ?, ?)
@@ -97,7 +150,8 @@ def get_license_status(reco_number: str):
             timestamp = excluded.timestamp,
             raw_response = excluded.raw_response
         ''', (reco_number, status_from_api, current_time, raw_response_str))
-        conn.commit()
+        if not conn_provided:
+            conn.commit()
 
         return {'status': status_from_api, 'last_checked': current_time, 'source': 'api', 'raw_response': api_response_data}
 
@@ -105,7 +159,7 @@ def get_license_status(reco_number: str):
         logger.error(f"SQLite error for RECO {reco_number} in get_license_status: {e}")
         return {'status': 'db_error', 'message': f'SQLite error: {e}', 'last_checked': current_time, 'source': 'internal_db_error'}
     finally:
-        if conn:
+        if not conn_provided and conn:
             conn.close()
 
 if __name__ == '__main__':
@@ -0,0 +1,208 @@
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import sqlite3
+from pathlib import Path
+from app.database import get_db_connection, init_db
+from app import json_codec
+from app.integrations.reco_api import status_from_description, normalize_reco_number
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REGISTRY_IMPORT_CHUNK_SIZE = int(os.environ.get("RECO_REGISTRY_IMPORT_CHUNK_SIZE", "5000"))
+# Registry rows older than this are ignored by sweeps, which then fall back to the RECO API.
+REGISTRY_MAX_AGE_SECONDS = int(os.environ.get("RECO_REGISTRY_MAX_AGE_SECONDS", str(7 * 24 * 60 * 60)))
+SWEEP_USE_RECO_REGISTRY = os.environ.get("SWEEP_USE_RECO_REGISTRY", "false").lower() == "true"
+
+# Column/key names accepted for each field, covering both RECO export headers and our own naming.
+RECO_NUMBER_KEYS = ("registrationNumber", "registration_number", "reco_number", "recoNumber")
+STATUS_KEYS = ("statusDescription", "status_description", "status")
+NAME_KEYS = ("name", "registrantName", "fullName")
+
+def _first_present(record, keys):
+    for key in keys:
+        value = record.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+def _iter_json_array(fh, read_size=64 * 1024):
+    """Yields the elements of a top-level JSON array without loading the whole document."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    eof = False
+    while True:
+        if not eof and len(buffer) < read_size:
+            chunk = fh.read(read_size)
+            eof = not chunk
+            buffer += chunk
+        buffer = buffer.lstrip()
+        if not started:
+            if not buffer:
+                return
+            if buffer[0] != "[":
+                raise ValueError("Expected a JSON array of registrant records.")
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer.startswith(","):
+            buffer = buffer[1:]
+            continue
+        if buffer.startswith("]"):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Element is split across reads; pull in more of the file.
+            chunk = fh.read(read_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield record
+
+def iter_registry_records(fh, file_format):
+    """Streams raw registrant records from an open text file in 'csv', 'ndjson' or 'json' (array) format."""
+    if file_format == "csv":
+        yield from csv.DictReader(fh)
+    elif file_format == "ndjson":
+        for line in fh:
+            if line.strip():
+                yield json_codec.loads(line)
+    elif file_format == "json":
+        yield from _iter_json_array(fh)
+    else:
+        raise ValueError(f"Unsupported registry file format: {file_format}")
+
+def detect_file_format(path):
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        return "csv"
+    if suffix in (".ndjson", ".jsonl"):
+        return "ndjson"
+    if suffix == ".json":
+        return "json"
+    raise ValueError(f"Cannot infer registry file format from '{path}'; expected .csv, .json, .ndjson or .jsonl.")
+
+def import_registry_records(records, source_name, chunk_size=None, replace=True, db_conn_passed=None):
+    """
+    Upserts registrant records into reco_registry in chunks of chunk_size, committing each chunk.
+
+    With replace=True, rows that were not part of this import are deleted once it finishes, so the
+    table mirrors the latest export. Returns a dict with imported/skipped counts.
+    """
+    chunk_size = chunk_size or REGISTRY_IMPORT_CHUNK_SIZE
+    conn_provided = bool(db_conn_passed)
+    conn = db_conn_passed if conn_provided else get_db_connection()
+    import_timestamp = time.time()
+    imported_count = 0
+    skipped_count = 0
+    unrecognized_count = 0
+    batch = []
+
+    def flush(cursor):
+        cursor.executemany("""
+            INSERT INTO reco_registry (reco_number, status, status_description, name, imported_timestamp, source_file)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(reco_number) DO UPDATE SET
+            status = excluded.status,
+            status_description = excluded.status_description,
+            name = excluded.name,
+            imported_timestamp = excluded.imported_timestamp,
+            source_file = excluded.source_file
+        """, batch)
+        conn.commit()
+        batch.clear()
+
+    try:
+        cursor = conn.cursor()
+        for record in records:
+            reco_number = normalize_reco_number(_first_present(record, RECO_NUMBER_KEYS))
+            if reco_number is None:
+                skipped_count += 1
+                continue
+            status_description = _first_present(record, STATUS_KEYS) or ""
+            status = status_from_description(status_description, reco_number, log_unrecognized=False)
+            if status == "not_found":
+                unrecognized_count += 1
+            batch.append((reco_number, status, status_description,
+                          _first_present(record, NAME_KEYS), import_timestamp, source_name))
+            imported_count += 1
+            if len(batch) >= chunk_size:
+                flush(cursor)
+                logger.info(f"Imported {imported_count} RECO registry rows so far from {source_name}.")
+        if batch:
+            flush(cursor)
+
+        removed_count = 0
+        if replace:
+            cursor.execute("DELETE FROM reco_registry WHERE imported_timestamp < ?", (import_timestamp,))
+            removed_count = cursor.rowcount
+            conn.commit()
+        logger.info(f"RECO registry import from {source_name} complete: {imported_count} imported, {skipped_count} skipped, {removed_count} stale rows removed.")
+        if unrecognized_count:
+            logger.warning(f"{unrecognized_count} RECO registry rows from {source_name} have an empty or unrecognized status; sweeps check those numbers against the API.")
+        return {"imported": imported_count, "skipped": skipped_count, "removed": removed_count, "unrecognized": unrecognized_count}
+    except sqlite3.Error as e:
+        logger.error(f"SQLite error importing RECO registry from {source_name}: {e}", exc_info=True)
+        conn.rollback()
+        raise
+    finally:
+        if not conn_provided and conn:
+            conn.close()
+
+def import_registry_file(path, file_format=None, chunk_size=None, replace=True):
+    file_format = file_format or detect_file_format(path)
+    with open(path, "r", encoding="utf-8-sig", newline="") as fh:
+        return import_registry_records(iter_registry_records(fh, file_format), Path(path).name, chunk_size, replace)
+
+def lookup_registry_statuses(conn, reco_numbers, max_age_seconds=None):
+    """
+    Resolves RECO numbers against reco_registry with a single join.
+
+    Returns {reco_number: status_details} in the same shape reco_api.get_license_status returns, for
+    numbers present in a sufficiently recent import. Numbers missing from the result need the API,
+    including registrants whose status description isn't recognized (the status is re-derived from
+    the stored description, so rows imported with an older mapping are read correctly).
+    """
+    max_age_seconds = REGISTRY_MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+    cursor = conn.cursor()
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS sweep_reco_numbers (reco_number TEXT PRIMARY KEY)")
+    cursor.execute("DELETE FROM temp.sweep_reco_numbers")
+    normalized_numbers = {normalize_reco_number(n) for n in reco_numbers} - {None}
+    cursor.executemany("INSERT OR IGNORE INTO temp.sweep_reco_numbers (reco_number) VALUES (?)", ((n,) for n in normalized_numbers))
+    cursor.execute("""
+        SELECT r.reco_number, r.status, r.status_description, r.imported_timestamp
+        FROM temp.sweep_reco_numbers m JOIN reco_registry r ON r.reco_number = m.reco_number
+        WHERE r.imported_timestamp >= ?
+    """, (time.time() - max_age_seconds,))
+    statuses = {}
+    for row in cursor.fetchall():
+        status = status_from_description(row["status_description"], row["reco_number"], log_unrecognized=False)
+        if status == "not_found":
+            continue
+        statuses[row["reco_number"]] = {
+            'status': status,
+            'last_checked': row["imported_timestamp"],
+            'source': 'registry',
+            'raw_response': {"statusDescription": row["status_description"]}
+        }
+    cursor.execute("DELETE FROM temp.sweep_reco_numbers")
+    logger.info(f"RECO registry resolved {len(statuses)} of {len(normalized_numbers)} RECO numbers locally.")
+    return statuses
+
+if __name__ == '__main__':
+    # Usage: python -m app.integrations.reco_registry <export.csv|export.json|export.ndjson>
+    init_db()
+    if len(sys.argv) < 2:
+        logger.error("Please pass the path of a RECO registrant export file.")
+        sys.exit(1)
+    result = import_registry_file(sys.argv[1])
+    logger.info(f"Import result: {result}")
@@ -1,6 +1,9 @@
 import os
+import time
 import requests
 import logging
+import threading
+from app.integrations.circuit_breaker import CircuitBreaker
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -8,6 +11,19 @@ logger = logging.getLogger(__name__)
 
 WICKET_API_BASE_URL = os.environ.get("WICKET_API_BASE_URL", "https://api.examplewicket.com/v1") # Replace with actual URL
 WICKET_API_TOKEN = os.environ.get("WICKET_API_TOKEN")
+# Health results are reused for this long so every dashboard load doesn't hit Wicket.
+HEALTH_CACHE_TTL_SECONDS = float(os.environ.get("WICKET_HEALTH_CACHE_TTL_SECONDS", "30"))
+
+# Wicket is called rarely (once per sweep plus health checks), so a few failures are enough to open.
+wicket_breaker = CircuitBreaker(
+    "wicket",
+    failure_rate_threshold=float(os.environ.get("WICKET_BREAKER_FAILURE_RATE", "0.5")),
+    window_size=int(os.environ.get("WICKET_BREAKER_WINDOW", "6")),
+    minimum_calls=int(os.environ.get("WICKET_BREAKER_MIN_CALLS", "3")),
+    open_seconds=int(os.environ.get("WICKET_BREAKER_OPEN_SECONDS", "60")),
+)
+_health_cache = {"checked_at": 0.0, "result": None}
+_health_cache_lock = threading.Lock()
 
 def _get_auth_headers():
     if not WICKET_API_TOKEN:
@@ -15,18 +31,32 @@ def _get_auth_headers():
         raise ValueError("WICKET_API_TOKEN is not configured.")
     return {"Authorization": f"Bearer {WICKET_API_TOKEN}"}
 
-def check_wicket_api_health():
-    """Checks the health of the Wicket API."""
-    try:
-        response = requests.get(f"{WICKET_API_BASE_URL}/health", headers=_get_auth_headers(), timeout=10) # Assuming a /health endpoint
-        response.raise_for_status() # Raises an HTTPError for bad responses (4XX or 5XX)
-        logger.info("Wicket API health check successful.")
-        return True, "Wicket API is healthy."
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Wicket API health check failed: {e}")
-        return False, f"Wicket API health check failed: {e}"
-    except ValueError as e: # Handles missing token
-         return False, str(e)
+def check_wicket_api_health(use_cache=True):
+    """Checks the health of the Wicket API, reusing a result younger than HEALTH_CACHE_TTL_SECONDS."""
+    with _health_cache_lock:
+        if use_cache and _health_cache["result"] and time.time() - _health_cache["checked_at"] < HEALTH_CACHE_TTL_SECONDS:
+            return _health_cache["result"]
+
+    if not wicket_breaker.allow_request():
+        result = (False, f"Wicket API circuit open after repeated failures; retrying in {wicket_breaker.seconds_until_retry()}s.")
+    else:
+        try:
+            response = requests.get(f"{WICKET_API_BASE_URL}/health", headers=_get_auth_headers(), timeout=10) # Assuming a /health endpoint
+            response.raise_for_status() # Raises an HTTPError for bad responses (4XX or 5XX)
+            logger.info("Wicket API health check successful.")
+            wicket_breaker.record_success()
+            result = (True, "Wicket API is healthy.")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Wicket API health check failed: {e}")
+            wicket_breaker.record_failure()
+            result = (False, f"Wicket API health check failed: {e}")
+        except ValueError as e: # Handles missing token
+            result = (False, str(e))
+
+    with _health_cache_lock:
+        _health_cache["checked_at"] = time.time()
+        _health_cache["result"] = result
+    return result
 
 
 def get_active_members():
@@ -42,6 +72,10 @@ def get_active_members():
          logger.error("Cannot fetch active members: WICKET_API_TOKEN is not set.")
          return []
 
+    if not wicket_breaker.allow_request():
+        logger.error(f"Cannot fetch active members: Wicket API circuit open, retrying in {wicket_breaker.seconds_until_retry()}s.")
+        return []
+
     try:
         headers = _get_auth_headers()
         # Assuming an endpoint like /members and parameters to filter active ones
@@ -65,6 +99,7 @@ def get_active_members():
                 logger.warning(f"Incomplete member data received: {member_data}")
 
         logger.info(f"Successfully fetched {len(members)} active members from Wicket.")
+        wicket_breaker.record_success()
         return members
 
     except requests.exceptions.HTTPError as e:
@@ -74,6 +109,7 @@ def get_active_members():
     except ValueError as e: # Catches JSON decoding errors or missing token
         logger.error(f"Error processing Wicket API response: {e}")
 
+    wicket_breaker.record_failure()
     return []
 
 if __name__ == '__main__':
@@ -0,0 +1,167 @@
+import os
+import json
+import math
+import time
+import logging
+import datetime
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 'auto' uses orjson when it's installed; 'stdlib' forces the json module (e.g. to compare output).
+JSON_CODEC = os.environ.get("JSON_CODEC", "auto").lower()
+
+orjson = None
+if JSON_CODEC != "stdlib":
+    try:
+        import orjson
+    except ImportError:
+        if JSON_CODEC == "orjson":
+            logger.warning("JSON_CODEC=orjson but orjson is not installed; using the stdlib json module.")
+
+CODEC_NAME = "orjson" if orjson else "stdlib"
+# orjson.JSONDecodeError subclasses this, so callers can keep catching json.JSONDecodeError.
+JSONDecodeError = json.JSONDecodeError
+
+class LazyJSON:
+    """
+    A JSON column value that is only decoded when something reads it.
+
+    Behaves like the decoded dict/list for item access, iteration, len() and get(). If the text
+    doesn't parse, a warning is logged and fallback is used as the value; dumps() writes the decoded
+    value (never the stored text as-is, which may predate this codec or not be valid JSON).
+    """
+    __slots__ = ("raw", "_value", "_decoded", "_fallback", "_label")
+
+    def __init__(self, raw, fallback=None, label=None):
+        self.raw = raw
+        self._value = None
+        self._decoded = False
+        self._fallback = fallback
+        self._label = label
+
+    @property
+    def value(self):
+        if not self._decoded:
+            try:
+                self._value = loads(self.raw)
+            except (JSONDecodeError, TypeError):
+                logger.warning(f"Could not parse JSON for {self._label or 'a stored value'}")
+                self._value = self._fallback
+            self._decoded = True
+        return self._value
+
+    def get(self, key, default=None):
+        value = self.value
+        return value.get(key, default) if isinstance(value, dict) else default
+
+    def __getitem__(self, key):
+        return self.value[key]
+
+    def __contains__(self, key):
+        return key in self.value
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __bool__(self):
+        return bool(self.value)
+
+    def __eq__(self, other):
+        return self.value == (other.value if isinstance(other, LazyJSON) else other)
+
+    def __repr__(self):
+        return f"LazyJSON({self.raw!r})"
+
+def lazy_loads(raw, fallback=None, label=None):
+    """Wraps a stored JSON string in LazyJSON; empty values stay None."""
+    return LazyJSON(raw, fallback, label) if raw else None
+
+def _encode_default(user_default):
+    def encode(obj):
+        if isinstance(obj, LazyJSON):
+            return obj.value
+        # orjson writes these natively as ISO 8601; match it so output doesn't depend on the codec.
+        if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+            return obj.isoformat()
+        if user_default is not None:
+            return user_default(obj)
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return encode
+
+def _finite(obj):
+    """Copy of obj with NaN/Infinity floats replaced by None, as orjson writes them."""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    if isinstance(obj, LazyJSON):
+        return _finite(obj.value)
+    return obj
+
+def dumps(obj, default=None):
+    """
+    Encodes obj to a JSON str (not bytes, so it's stored as SQLite TEXT and works with json_each()).
+
+    Non-finite floats are written as null by both codecs (NaN/Infinity aren't JSON and loads() rejects them).
+    """
+    encode_default = _encode_default(default)
+    if orjson:
+        return orjson.dumps(obj, default=encode_default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    try:
+        return json.dumps(obj, default=encode_default, allow_nan=False)
+    except ValueError as e:
+        if "Out of range float" not in str(e):
+            raise
+    # Rare: only values containing NaN/Infinity pay for the copy.
+    return json.dumps(_finite(obj), default=lambda o: _finite(encode_default(o)), allow_nan=False)
+
+def _reject_constant(name):
+    raise JSONDecodeError(f"{name} is not valid JSON", name, 0)
+
+def loads(data):
+    if orjson:
+        return orjson.loads(data)
+    # Reject NaN/Infinity like orjson (and SQLite's json_each()) do, so both codecs accept the same input.
+    return json.loads(data, parse_constant=_reject_constant)
+
+def join_encoded_array(encoded_items):
+    """Builds a JSON array from already-encoded items without decoding them."""
+    return "[" + ",".join(encoded_items) + "]"
+
+if __name__ == '__main__':
+    # Rough comparison of this codec with the stdlib on a synthetic run_history blob.
+    # Usage: python -m app.json_codec [member_count]   (JSON_CODEC=stdlib to time the fallback alone)
+    import sys
+    member_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    raw_response_text = json.dumps([{"registrationNumber": "1000", "statusDescription": "Active", "name": "Example Brokerage"}])
+    history = [{"name": f"Member {i}", "reco_number": str(1000 + i), "wicket_status": "active",
+                "reco_status_details": {"status": "active", "last_checked": time.time(), "source": "cache",
+                                        "raw_response": json.loads(raw_response_text)},
+                "overall_status": "ok"} for i in range(member_count)]
+    lazy_history = [dict(entry, reco_status_details=dict(entry["reco_status_details"], raw_response=LazyJSON(raw_response_text)))
+                    for entry in history]
+    blob = json.dumps(history)
+
+    def timed(label, func, repeat=5):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        logger.info(f"  {label:<45} {min(timings) * 1000:8.1f} ms")
+
+    logger.info(f"Codec: {CODEC_NAME}; {member_count} members, {len(blob) / 1024:.0f} KiB history blob")
+    timed("stdlib json.dumps(history)", lambda: json.dumps(history))
+    timed("codec dumps(history)", lambda: dumps(history))
+    timed("codec dumps(history with lazy raw_response)", lambda: dumps(lazy_history))
+    timed("stdlib json.loads(blob)", lambda: json.loads(blob))
+    timed("codec loads(blob)", lambda: loads(blob))
+    encoded_entries = [dumps(entry) for entry in history]
+    timed("dumps([loads(entry) ...]) (old finalize)", lambda: dumps([loads(entry) for entry in encoded_entries]))
+    timed("join_encoded_array(entries) (new finalize)", lambda: join_encoded_array(encoded_entries))
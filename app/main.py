@@ -1,11 +1,20 @@
 import os
+import time
+import zlib
 import datetime
-import json
-from flask import Flask, jsonify, request, render_template
-from app.database import init_db, get_db_connection
-from app.core_logic import perform_license_validation_sweep, get_last_run_results, get_all_alerts
+import threading
+from pathlib import Path
+from flask import Flask, jsonify, request, render_template, make_response, Response, stream_with_context
+from app.database import init_db, get_db_connection, get_data_versions
+from app.core_logic import perform_license_validation_sweep, resume_license_validation_sweep, get_last_run_results, get_all_alerts
+from app.sharded_sweep import perform_sharded_license_validation_sweep, SWEEP_WORKER_COUNT
 from app.notifications import send_notification_for_lapsed_licenses_db
-from app.integrations.wicket_api import check_wicket_api_health
+from app import events as ui_events
+from app import exports
+from app import json_codec
+from app.filters import parse_filters, has_filters, processed_member_matches, RESULT_STATUSES, ALERT_STATUSES
+from app.integrations.wicket_api import check_wicket_api_health, wicket_breaker
+from app.integrations.reco_api import reco_breaker
 
 IS_TEST_ENVIRONMENT = os.environ.get("FLASK_TESTING", "false").lower() == "true"
 
@@ -23,36 +32,236 @@ def format_datetime_filter(value, format_str='%Y-%m-%d %H:%M:%S'): # Renamed for
 
 app.jinja_env.filters['format_datetime'] = format_datetime_filter
 
+def _templates_fingerprint():
+    template_files = sorted((Path(app.root_path) / app.template_folder).glob("*.html"))
+    return format(zlib.crc32(b"".join(path.read_bytes() for path in template_files)), "x")
+
+# Included in every ETag so a deploy with changed templates never matches a browser's old copy.
+TEMPLATES_FINGERPRINT = _templates_fingerprint()
+# Rendered HTMX fragments keyed by endpoint, holding only the body for the latest data version.
+_fragment_cache = {}
+_fragment_cache_lock = threading.Lock()
+
+def cached_fragment_response(cache_key, version_names, render, cache_body=True):
+    """
+    Serves a rendered fragment with a versioned ETag/Last-Modified.
+
+    Returns 304 without calling render() when the client's copy is current, cached bytes when another client already rendered
+    this version, and only calls render() when the underlying tables changed since the last render.
+    With cache_body=False (e.g. filtered views) only the ETag/304 handling applies.
+    """
+    data_versions = get_data_versions(version_names)
+    version_key = tuple(data_versions.get(name, (0, 0))[0] for name in version_names)
+    etag = f"{cache_key}-{TEMPLATES_FINGERPRINT}-" + "-".join(str(v) for v in version_key)
+    last_modified = max((updated for _, updated in data_versions.values()), default=None)
+
+    if request.if_none_match.contains_weak(etag):
+        # The client's copy is current: answer without querying or rendering anything.
+        response = make_response('', 304)
+        response.set_etag(etag, weak=True)
+        if last_modified:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    with _fragment_cache_lock:
+        cached_entry = _fragment_cache.get(cache_key) if cache_body else None
+    if cached_entry and cached_entry[0] == version_key:
+        body = cached_entry[1]
+    else:
+        body = render()
+        if cache_body:
+            with _fragment_cache_lock:
+                _fragment_cache[cache_key] = (version_key, body)
+
+    response = make_response(body)
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # Let browsers keep the fragment but revalidate it on every hx-get.
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', result_statuses=RESULT_STATUSES, alert_statuses=ALERT_STATUSES)
 
 @app.route('/check-members', methods=['GET', 'POST'])
 def check_members_route():
     app.logger.info("Received request to /check-members. Triggering sweep.")
-    results = perform_license_validation_sweep()
+    if SWEEP_WORKER_COUNT > 1:
+        results = perform_sharded_license_validation_sweep()
+    else:
+        results = perform_license_validation_sweep()
     app.logger.info("/check-members sweep completed.")
     return render_template('_results_table.html', results=results)
 
+@app.route('/resume-sweep', methods=['POST'])
+def resume_sweep_route():
+    app.logger.info("Received request to /resume-sweep. Resuming interrupted sweep.")
+    force = request.args.get('force', 'false').lower() == 'true'
+    results = resume_license_validation_sweep(force=force)
+    app.logger.info(f"/resume-sweep finished with status {results.get('status')}.")
+    return render_template('_results_table.html', results=results)
+
+def _filters_cache_key(endpoint, filters):
+    if not has_filters(filters):
+        return endpoint
+    filters_key = "&".join(f"{name}={value}" for name, value in sorted(filters.items()) if value)
+    return f"{endpoint}-{zlib.crc32(filters_key.encode('utf-8')):x}"
+
+def _render_results(filters):
+    results = get_last_run_results()
+    if has_filters(filters) and isinstance(results.get('all_processed_members'), list):
+        results['all_processed_members'] = [member for member in results['all_processed_members']
+                                            if processed_member_matches(member, filters)]
+    return render_template('_results_table.html', results=results, filters_active=has_filters(filters))
+
 @app.route('/results', methods=['GET'])
 def get_results_route():
     app.logger.info("Received request for /results (HTML partial).")
-    results_data = get_last_run_results()
-    return render_template('_results_table.html', results=results_data)
+    filters = parse_filters(request.args)
+    return cached_fragment_response(_filters_cache_key('results', filters), ('run_history',),
+                                    lambda: _render_results(filters), cache_body=not has_filters(filters))
 
 @app.route('/alerts', methods=['GET'])
 def get_alerts_route():
     app.logger.info("Received request for /alerts (HTML partial).")
-    alerts_data = get_all_alerts()
-    return render_template('_alerts_table.html', alerts=alerts_data)
+    filters = parse_filters(request.args)
+    return cached_fragment_response(_filters_cache_key('alerts', filters), ('alerts',),
+                                    lambda: render_template('_alerts_table.html', alerts=get_all_alerts(filters),
+                                                            filters_active=has_filters(filters)),
+                                    cache_body=not has_filters(filters))
+
+def _export_response(chunks, export_format, basename):
+    """
+    Streams an export as an attachment.
+
+    ?gzip=true downloads a .gz file; otherwise the body is gzipped on the fly (Content-Encoding)
+    when the client accepts it, so large exports aren't sent uncompressed.
+    """
+    filename = f"{basename}.{export_format}"
+    headers = {'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'}
+    mimetype = exports.EXPORT_FORMATS[export_format]
+    if request.args.get('gzip', 'false').lower() == 'true':
+        chunks = exports.iter_gzip(chunks)
+        filename += ".gz"
+        mimetype = 'application/gzip'
+    elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+        chunks = exports.iter_gzip(chunks)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+def _requested_export_format():
+    export_format = request.args.get('format', 'csv').lower()
+    return export_format if export_format in exports.EXPORT_FORMATS else None
+
+@app.route('/export/results', methods=['GET'])
+def export_results_route():
+    export_format = _requested_export_format()
+    if not export_format:
+        return f"Unsupported export format. Use one of: {', '.join(exports.EXPORT_FORMATS)}.", 400
+    requested_run_id = request.args.get('run_id', type=int)
+    if requested_run_id is None and request.args.get('run_id'):
+        return "run_id must be an integer.", 400
+    run_id = exports.get_exportable_run_id(requested_run_id)
+    if not run_id:
+        if requested_run_id is not None:
+            return f"No completed sweep with run_id {requested_run_id}.", 404
+        return "No completed sweep to export.", 404
+    filters = parse_filters(request.args)
+    app.logger.info(f"Streaming {export_format} export of run {run_id} results (filters: {filters}).")
+    chunks = exports.iter_encoded(exports.iter_run_result_rows(run_id, filters), exports.RESULT_EXPORT_COLUMNS, export_format)
+    return _export_response(chunks, export_format, f"sweep-results-{run_id}")
+
+@app.route('/export/alerts', methods=['GET'])
+def export_alerts_route():
+    export_format = _requested_export_format()
+    if not export_format:
+        return f"Unsupported export format. Use one of: {', '.join(exports.EXPORT_FORMATS)}.", 400
+    filters = parse_filters(request.args)
+    app.logger.info(f"Streaming {export_format} export of alerts (filters: {filters}).")
+    chunks = exports.iter_encoded(exports.iter_alert_rows(filters), exports.ALERT_EXPORT_COLUMNS, export_format)
+    return _export_response(chunks, export_format, f"alerts-{datetime.date.today().isoformat()}")
 
 @app.route('/wicket-api-health', methods=['GET'])
 def wicket_api_health_route():
     app.logger.info("Received request for /wicket-api-health (HTML partial).")
     if IS_TEST_ENVIRONMENT and not os.environ.get("WICKET_API_TOKEN"):
         app.logger.warning("WICKET_API_TOKEN not set for Wicket health check in test env.")
-    healthy, message = check_wicket_api_health()
-    return render_template('_wicket_health.html', health_status={"wicket_api_healthy": healthy, "message": message})
+    # Clicking the "Check" button forces a live check; the on-load request may reuse a recent result.
+    force_live_check = request.args.get('refresh', 'false').lower() == 'true'
+    healthy, message = check_wicket_api_health(use_cache=not force_live_check)
+    health_status = {"wicket_api_healthy": healthy, "message": message,
+                     "breakers": [wicket_breaker.snapshot(), reco_breaker.snapshot()]}
+    return render_template('_wicket_health.html', health_status=health_status)
+
+def _render_sse_messages(event, conn):
+    """Turns one stored event into (sse_event_name, html) pairs for the HTMX sse extension."""
+    payload = event["payload"]
+    event_type = event["event_type"]
+    if event_type in ('alert_flagged', 'alert_updated', 'alert_cleared'):
+        reco_number = payload.get("reco_number")
+        alert_row = conn.execute("SELECT * FROM alerts WHERE reco_number = ?", (reco_number,)).fetchone()
+        if not alert_row:
+            # Swapping the row for a comment removes it from the table (EventSource drops empty data).
+            return [(f"alert-row-{reco_number}", "<!-- alert cleared -->")]
+        row_html = render_template('_alert_row.html', alert=dict(alert_row))
+        if event_type == 'alert_flagged':
+            return [("alert-new", row_html)]
+        return [(f"alert-row-{reco_number}", row_html)]
+    if event_type == 'sweep_progress':
+        return [("sweep-progress", render_template('_sweep_progress.html', progress=payload))]
+    if event_type == 'run_finished':
+        return [("run-finished", render_template('_sweep_progress.html', progress=payload))]
+    return []
+
+@app.route('/events', methods=['GET'])
+def events_stream_route():
+    """
+    Server-sent events stream of sweep progress and alert row changes.
+
+    Resumes after the Last-Event-ID header when the browser reconnects; a fresh connection only
+    receives events from now on. If the client fell behind the retained events a 'resync' event
+    tells the page to refetch its tables.
+    """
+    last_event_id_header = request.headers.get('Last-Event-ID')
+    last_event_id = int(last_event_id_header) if last_event_id_header and last_event_id_header.isdigit() else None
+
+    def generate():
+        conn = get_db_connection()
+        try:
+            current_event_id = last_event_id if last_event_id is not None else ui_events.get_latest_event_id(conn)
+            if last_event_id is not None and last_event_id < ui_events.get_oldest_event_id(conn) - 1:
+                yield ui_events.format_sse('resync', 'resync')
+            stream_started = time.time()
+            last_sent = stream_started
+            while time.time() - stream_started < ui_events.SSE_MAX_STREAM_SECONDS:
+                pending_events = ui_events.get_events_after(current_event_id, db_conn_passed=conn)
+                # Several changes to one alert in a batch only need the latest rendering of its row.
+                last_index_for_reco = {}
+                for index, event in enumerate(pending_events):
+                    if event["event_type"] == 'alert_updated':
+                        last_index_for_reco[event["payload"].get("reco_number")] = index
+                for index, event in enumerate(pending_events):
+                    current_event_id = event["id"]
+                    if event["event_type"] == 'alert_updated' and last_index_for_reco.get(event["payload"].get("reco_number")) != index:
+                        continue
+                    for sse_event_name, html in _render_sse_messages(event, conn):
+                        yield ui_events.format_sse(sse_event_name, html, event["id"])
+                        last_sent = time.time()
+                if time.time() - last_sent >= ui_events.SSE_KEEPALIVE_SECONDS:
+                    yield ": keepalive\n\n"
+                    last_sent = time.time()
+                if len(pending_events) < ui_events.SSE_BATCH_LIMIT:
+                    time.sleep(ui_events.SSE_POLL_SECONDS)
+        finally:
+            conn.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/resend-alert', methods=['POST'])
 def resend_alert_route():
@@ -81,13 +290,9 @@ def resend_alert_route():
 
         # Convert sqlite3.Row to a dictionary for easier manipulation and to pass to notification function
         alert_to_resend_original = dict(alert_row_from_db)
-        # If notification_details is stored as JSON string, parse it (optional, depends on needs)
-        if alert_to_resend_original.get('notification_details') and isinstance(alert_to_resend_original.get('notification_details'), str):
-            try:
-                alert_to_resend_original['notification_details'] = json.loads(alert_to_resend_original['notification_details'])
-            except json.JSONDecodeError:
-                logger.warning(f"Could not parse notification_details for {reco_to_resend} during resend prep.")
-                alert_to_resend_original['notification_details'] = None # Or some error indicator
+        # notification_details is stored as a JSON string; it's only decoded if something reads it
+        alert_to_resend_original['notification_details'] = json_codec.lazy_loads(alert_to_resend_original.get('notification_details'),
+                                                                                label=f"notification_details of {reco_to_resend}")
 
         # No need to keep the connection open to reco_api's DB during the SendGrid call
         conn.close()
@@ -105,11 +310,8 @@ def resend_alert_route():
 
         if final_alert_row_from_db:
             final_alert_status_dict = dict(final_alert_row_from_db)
-            if final_alert_status_dict.get('notification_details') and isinstance(final_alert_status_dict.get('notification_details'), str):
-                try:
-                    final_alert_status_dict['notification_details'] = json.loads(final_alert_status_dict['notification_details'])
-                except json.JSONDecodeError:
-                     final_alert_status_dict['notification_details'] = {"error": "parse failed"}
+            final_alert_status_dict['notification_details'] = json_codec.lazy_loads(final_alert_status_dict.get('notification_details'), fallback={"error": "parse failed"},
+                                                                                    label=f"notification_details of {reco_to_resend}")
             final_alert_status_dict['message_after_resend'] = message # Add the outcome message for display
         else:
             # Alert might have been cleared by another process between sending and re-fetching.
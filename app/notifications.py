@@ -1,11 +1,11 @@
 import os
 import logging
 import time
-import json
 import sqlite3
 from sendgrid import SendGridAPIClient # Ensure sendgrid is imported
 from sendgrid.helpers.mail import Mail # Ensure Mail is imported
 from app.database import get_db_connection, init_db
+from app import json_codec
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -56,7 +56,7 @@ def send_notification_for_lapsed_licenses_db(newly_flagged_members: list, db_con
 
         if response.status_code in [200, 202]: # 202 is accepted by SendGrid
             cursor = conn.cursor()
-            notification_details_str = json.dumps({
+            notification_details_str = json_codec.dumps({
                 "to": NOTIFY_EMAIL_TO,
                 "subject": subject,
                 "status_code": response.status_code,
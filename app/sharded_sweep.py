@@ -0,0 +1,323 @@
+import os
+import sys
+import time
+import uuid
+import zlib
+import logging
+import sqlite3
+import multiprocessing
+from app.database import get_db_connection, init_db
+from app import json_codec
+from app.integrations import wicket_api, reco_registry
+from app.core_logic import process_member_for_sweep, build_sweep_summary, dedupe_flagged_members, notify_flagged_members, get_last_run_results, default_worker_id
+from app.sweep_planning import plan_sweep
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of hash partitions a sweep is split into, and how many local worker processes
+# perform_sharded_license_validation_sweep starts. Other processes on the same host can join a
+# running sweep with run_shard_worker(); the database is SQLite in WAL mode, which needs shared
+# memory, so workers on other hosts (e.g. over a network filesystem) are not supported.
+# Keep workers * per-worker request rate under
+# the RECO API rate limit; beyond that extra workers only add throttling errors.
+SWEEP_SHARD_COUNT = int(os.environ.get("SWEEP_SHARD_COUNT", "8"))
+SWEEP_WORKER_COUNT = int(os.environ.get("SWEEP_WORKER_COUNT", "1"))
+SHARD_LEASE_SECONDS = int(os.environ.get("SHARD_LEASE_SECONDS", "300"))
+
+def shard_index_for_reco_number(reco_number, shard_count):
+    """Stable (process-independent) shard assignment for a RECO number."""
+    if not reco_number:
+        return 0
+    return zlib.crc32(str(reco_number).strip().encode("utf-8")) % shard_count
+
+def create_sharded_sweep(shard_count=None):
+    """
+    Fetches active members from Wicket once and partitions them into pending shard rows.
+
+    Returns the new sweep_id, or None if the sweep was aborted because Wicket returned no members
+    (an 'aborted' run_history row is recorded, as with the single-process sweep).
+    """
+    shard_count = shard_count or SWEEP_SHARD_COUNT
+    active_wicket_members = wicket_api.get_active_members()
+    current_time_sweep = time.time()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        if not active_wicket_members:
+            logger.warning("No active members from Wicket. Aborting sharded sweep.")
+            cursor.execute("INSERT INTO run_history (run_timestamp, status, message, summary, newly_flagged_members_count, all_processed_members_details) VALUES (?, ?, ?, ?, ?, ?)",
+                           (current_time_sweep, "aborted", "No active members from Wicket", json_codec.dumps({}), 0, json_codec.dumps([])))
+            conn.commit()
+            return None
+
+        registry_statuses = reco_registry.lookup_registry_statuses(conn, [m.get("reco_number") for m in active_wicket_members]) if reco_registry.SWEEP_USE_RECO_REGISTRY else None
+        planned_members, plan_stats = plan_sweep(active_wicket_members, conn, registry_statuses)
+        # Shard on the normalized number so members sharing it land in one shard and it's looked up once.
+        # Each member keeps its position in the plan so the merged history follows the planned priority order.
+        shards = [[] for _ in range(shard_count)]
+        for member_index, member in enumerate(planned_members):
+            shards[shard_index_for_reco_number(member.get("reco_number"), shard_count)].append([member_index, member])
+
+        sweep_id = uuid.uuid4().hex
+        cursor.execute("INSERT INTO sharded_sweeps (sweep_id, created_timestamp, shard_count, total_members, status, plan_summary) VALUES (?, ?, ?, ?, ?, ?)",
+                       (sweep_id, current_time_sweep, shard_count, len(active_wicket_members), "running", json_codec.dumps(plan_stats)))
+        cursor.executemany("INSERT INTO sweep_shards (sweep_id, shard_index, status, members) VALUES (?, ?, 'pending', ?)",
+                           [(sweep_id, shard_index, json_codec.dumps(shard_members)) for shard_index, shard_members in enumerate(shards)])
+        conn.commit()
+        logger.info(f"Created sharded sweep {sweep_id}: {len(active_wicket_members)} members across {shard_count} shards.")
+        return sweep_id
+    finally:
+        conn.close()
+
+def claim_shard(conn, sweep_id, worker_id):
+    """
+    Atomically leases the next pending shard (or one whose lease has expired) to worker_id.
+
+    Returns the claimed sweep_shards row, or None if nothing is claimable right now.
+    """
+    now = time.time()
+    cursor = conn.cursor()
+    # BEGIN IMMEDIATE takes the write lock up front so two workers can't select the same shard.
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("""
+            SELECT * FROM sweep_shards
+            WHERE sweep_id = ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+            ORDER BY shard_index LIMIT 1
+        """, (sweep_id, now))
+        shard_row = cursor.fetchone()
+        if shard_row:
+            if shard_row["status"] == "leased":
+                logger.warning(f"Shard {shard_row['shard_index']} of sweep {sweep_id} lease held by {shard_row['lease_owner']} expired; reclaiming.")
+            cursor.execute("UPDATE sweep_shards SET status = 'leased', lease_owner = ?, lease_expires = ?, started_timestamp = ? WHERE sweep_id = ? AND shard_index = ?",
+                           (worker_id, now + SHARD_LEASE_SECONDS, now, sweep_id, shard_row["shard_index"]))
+        conn.commit()
+        return shard_row
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def _renew_lease(cursor, sweep_id, shard_index, worker_id):
+    cursor.execute("UPDATE sweep_shards SET lease_expires = ? WHERE sweep_id = ? AND shard_index = ? AND lease_owner = ? AND status = 'leased'",
+                   (time.time() + SHARD_LEASE_SECONDS, sweep_id, shard_index, worker_id))
+    return cursor.rowcount > 0
+
+def process_shard(conn, shard_row, worker_id, current_time_sweep):
+    """
+    Validates every member in a leased shard and stores the shard's results.
+
+    Alert changes are committed per member so the write lock is never held across a
+    RECO API call (other workers and reco_api's cache writes share the same database).
+    Returns False if the lease was lost to another worker before the shard finished.
+
+    If the RECO circuit breaker opens, the shard is recorded with the members checked so far and
+    every still-pending shard of the sweep is closed out unchecked, so the sweep ends early as 'degraded'.
+    """
+    sweep_id, shard_index = shard_row["sweep_id"], shard_row["shard_index"]
+    shard_members = json_codec.loads(shard_row["members"])
+    cursor = conn.cursor()
+    processed_members = []
+    flagged_members = []
+    lease_renew_at = time.time() + SHARD_LEASE_SECONDS / 2
+    known_statuses = {}
+    if reco_registry.SWEEP_USE_RECO_REGISTRY:
+        known_statuses = reco_registry.lookup_registry_statuses(conn, [member.get("reco_number") for _, member in shard_members])
+        conn.commit()
+
+    degraded = False
+    for member_index, member in shard_members:
+        history_entry, flagged_alert = process_member_for_sweep(member, cursor, current_time_sweep, known_statuses)
+        if history_entry["reco_status_details"].get("source") == "circuit_open":
+            logger.warning(f"RECO API unavailable; worker {worker_id} ending shard {shard_index} of sweep {sweep_id} early.")
+            degraded = True
+            break
+        processed_members.append([member_index, history_entry])
+        if flagged_alert:
+            flagged_members.append([member_index, flagged_alert])
+        if time.time() >= lease_renew_at:
+            if not _renew_lease(cursor, sweep_id, shard_index, worker_id):
+                conn.commit()
+                logger.warning(f"Lost lease on shard {shard_index} of sweep {sweep_id}; abandoning it.")
+                return False
+            lease_renew_at = time.time() + SHARD_LEASE_SECONDS / 2
+        conn.commit()
+
+    cursor.execute("""
+        UPDATE sweep_shards
+        SET status = 'done', finished_timestamp = ?, processed_members_details = ?, flagged_members = ?, degraded = ?, lease_expires = NULL
+        WHERE sweep_id = ? AND shard_index = ? AND lease_owner = ? AND status = 'leased'
+    """, (time.time(), json_codec.dumps(processed_members), json_codec.dumps(flagged_members), int(degraded), sweep_id, shard_index, worker_id))
+    completed = cursor.rowcount > 0
+    if degraded:
+        cursor.execute("""
+            UPDATE sweep_shards
+            SET status = 'done', finished_timestamp = ?, processed_members_details = '[]', flagged_members = '[]', degraded = 1
+            WHERE sweep_id = ? AND status = 'pending'
+        """, (time.time(), sweep_id))
+    conn.commit()
+    if completed:
+        logger.info(f"Worker {worker_id} finished shard {shard_index} of sweep {sweep_id} ({len(processed_members)} members).")
+    else:
+        logger.warning(f"Shard {shard_index} of sweep {sweep_id} was reclaimed before {worker_id} could record it; results discarded.")
+    return completed
+
+def finalize_sharded_sweep(sweep_id):
+    """
+    Merges the results of a fully processed sweep into a single run_history entry and sends notifications.
+
+    Safe to call from every worker: only the caller that flips the sweep from 'running' to 'merging'
+    does the merge. Returns the new run_history id, or None if the sweep isn't ready or was merged elsewhere.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT COUNT(*) FROM sweep_shards WHERE sweep_id = ? AND status != 'done'", (sweep_id,))
+        if cursor.fetchone()[0] > 0:
+            conn.rollback()
+            return None
+        cursor.execute("UPDATE sharded_sweeps SET status = 'merging' WHERE sweep_id = ? AND status = 'running'", (sweep_id,))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return None
+
+        cursor.execute("SELECT created_timestamp, total_members, plan_summary FROM sharded_sweeps WHERE sweep_id = ?", (sweep_id,))
+        sweep_row = cursor.fetchone()
+        processed_members = []
+        degraded = False
+        cursor.execute("SELECT processed_members_details, degraded FROM sweep_shards WHERE sweep_id = ? ORDER BY shard_index", (sweep_id,))
+        for shard_row in cursor.fetchall():
+            degraded = degraded or bool(shard_row["degraded"])
+            processed_members.extend(json_codec.loads(shard_row["processed_members_details"]))
+        processed_members_for_history = [entry for _, entry in sorted(processed_members, key=lambda pair: pair[0])]
+        newly_flagged_for_notification = get_sweep_flagged_members(cursor, sweep_id)
+
+        cursor.execute("SELECT COUNT(*) FROM alerts")
+        total_alerts_active = cursor.fetchone()[0]
+        plan_stats = json_codec.loads(sweep_row["plan_summary"]) if sweep_row["plan_summary"] else None
+        summary_obj = build_sweep_summary(sweep_row["total_members"], processed_members_for_history, newly_flagged_for_notification, total_alerts_active, plan_stats)
+        run_status, run_message = "completed", None
+        if degraded:
+            run_status = "degraded"
+            summary_obj["members_not_checked"] = sweep_row["total_members"] - len(processed_members_for_history)
+            run_message = f"RECO API unavailable; {summary_obj['members_not_checked']} member(s) were not checked."
+        cursor.execute("INSERT INTO run_history (run_timestamp, status, message, summary, newly_flagged_members_count, all_processed_members_details) VALUES (?, ?, ?, ?, ?, ?)",
+                       (sweep_row["created_timestamp"], run_status, run_message, json_codec.dumps(summary_obj), len(newly_flagged_for_notification), json_codec.dumps(processed_members_for_history)))
+        run_history_id = cursor.lastrowid
+        cursor.execute("UPDATE sharded_sweeps SET status = 'completed', run_history_id = ? WHERE sweep_id = ?", (run_history_id, sweep_id))
+        # Shard payloads are only needed until the merge; drop them to keep the table small. The (short)
+        # flagged lists are kept so the process that started the sweep can return them, whichever worker merged.
+        cursor.execute("UPDATE sweep_shards SET members = '[]', processed_members_details = NULL WHERE sweep_id = ?", (sweep_id,))
+        conn.commit()
+        logger.info(f"Merged sharded sweep {sweep_id} into run_history id {run_history_id}.")
+
+        notify_flagged_members(newly_flagged_for_notification, conn)
+        return run_history_id
+    except sqlite3.Error as e:
+        logger.error(f"SQLite error finalizing sharded sweep {sweep_id}: {e}", exc_info=True)
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+
+def get_sweep_flagged_members(cursor, sweep_id):
+    """Members flagged by a sweep's shards, in member order and deduped by RECO number."""
+    cursor.execute("SELECT flagged_members FROM sweep_shards WHERE sweep_id = ? AND flagged_members IS NOT NULL", (sweep_id,))
+    flagged_members = []
+    for shard_row in cursor.fetchall():
+        flagged_members.extend(json_codec.loads(shard_row["flagged_members"]))
+    return dedupe_flagged_members([alert for _, alert in sorted(flagged_members, key=lambda pair: pair[0])])
+
+def get_latest_running_sweep_id():
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT sweep_id FROM sharded_sweeps WHERE status = 'running' ORDER BY created_timestamp DESC LIMIT 1").fetchone()
+        return row["sweep_id"] if row else None
+    finally:
+        conn.close()
+
+def run_shard_worker(sweep_id=None, worker_id=None):
+    """
+    Claims and processes shards of a sweep until none are left, then attempts the merge.
+
+    If sweep_id is None the most recent running sweep is joined, which lets another process on
+    this host (e.g. `python -m app.sharded_sweep worker`) help with a sweep started elsewhere.
+    Returns the number of shards this worker completed.
+    """
+    sweep_id = sweep_id or get_latest_running_sweep_id()
+    if not sweep_id:
+        logger.info("No running sharded sweep to join.")
+        return 0
+    worker_id = worker_id or default_worker_id()
+    shards_completed = 0
+    conn = get_db_connection()
+    try:
+        created_row = conn.execute("SELECT created_timestamp FROM sharded_sweeps WHERE sweep_id = ?", (sweep_id,)).fetchone()
+        if not created_row:
+            logger.error(f"Sharded sweep {sweep_id} not found.")
+            return 0
+        while True:
+            shard_row = claim_shard(conn, sweep_id, worker_id)
+            if not shard_row:
+                break
+            if process_shard(conn, shard_row, worker_id, created_row["created_timestamp"]):
+                shards_completed += 1
+    except Exception as e:
+        logger.error(f"Worker {worker_id} failed on sweep {sweep_id}: {e}", exc_info=True)
+        conn.rollback()
+    finally:
+        conn.close()
+
+    finalize_sharded_sweep(sweep_id)
+    return shards_completed
+
+def perform_sharded_license_validation_sweep(shard_count=None, worker_count=None):
+    """
+    Runs a full sweep split across worker_count local processes and returns the merged run,
+    in the same shape as perform_license_validation_sweep().
+    """
+    worker_count = worker_count or SWEEP_WORKER_COUNT
+    try:
+        sweep_id = create_sharded_sweep(shard_count)
+    except Exception as e:
+        logger.error(f"Error creating sharded sweep: {e}", exc_info=True)
+        return {"timestamp": time.time(), "status": "error", "message": f"Error creating sharded sweep: {e}", "summary": {}, "flagged_this_run": [], "all_processed_members": []}
+    if not sweep_id:
+        return get_last_run_results()
+
+    workers = [multiprocessing.Process(target=run_shard_worker, args=(sweep_id,)) for _ in range(worker_count - 1)]
+    for worker in workers:
+        worker.start()
+    run_shard_worker(sweep_id)
+    for worker in workers:
+        worker.join()
+
+    conn = get_db_connection()
+    try:
+        sweep_row = conn.execute("SELECT status, run_history_id FROM sharded_sweeps WHERE sweep_id = ?", (sweep_id,)).fetchone()
+        # 'completed' is the coordination status; the merged run_history entry itself may be 'degraded'.
+        if not sweep_row or sweep_row["status"] != "completed":
+            # Some shard is still leased by another worker process (or a local worker died); its lease will expire
+            # and any worker that joins afterwards will pick the shard up and complete the merge.
+            return {"timestamp": time.time(), "status": "error", "message": f"Sharded sweep {sweep_id} has unfinished shards.", "summary": {}, "flagged_this_run": [], "all_processed_members": []}
+        # The merge (and its notifications) may have run in another worker process, so read the list back.
+        flagged_this_run = get_sweep_flagged_members(conn.cursor(), sweep_id)
+    finally:
+        conn.close()
+    run_result = get_last_run_results()
+    run_result["flagged_this_run"] = flagged_this_run
+    return run_result
+
+if __name__ == '__main__':
+    # Usage: python -m app.sharded_sweep [start|worker] [sweep_id]
+    init_db()
+    action = sys.argv[1] if len(sys.argv) > 1 else "start"
+    if action == "worker":
+        completed = run_shard_worker(sys.argv[2] if len(sys.argv) > 2 else None)
+        logger.info(f"Worker completed {completed} shard(s).")
+    else:
+        sweep_results = perform_sharded_license_validation_sweep()
+        logger.info(f"Status: {sweep_results.get('status')}")
+        for key, value in sweep_results.get("summary", {}).items():
+            logger.info(f"  {key.replace('_', ' ').capitalize()}: {value}")
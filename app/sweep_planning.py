@@ -0,0 +1,108 @@
+import time
+import logging
+from app.integrations import reco_api
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PLAN_GROUP_CACHE = "cache"
+PLAN_GROUP_REGISTRY = "registry"
+PLAN_GROUP_API = "api"
+PLAN_GROUP_INVALID = "invalid"
+PLAN_GROUP_MISSING = "missing"
+
+# Lower ranks are processed first within the previously-flagged and the remaining members.
+_GROUP_RANK = {PLAN_GROUP_CACHE: 0, PLAN_GROUP_REGISTRY: 1, PLAN_GROUP_API: 2}
+
+def _fresh_cache_timestamps(conn, reco_numbers):
+    """Returns {reco_number: cached_timestamp} for numbers with an unexpired reco_cache entry, using one join."""
+    cursor = conn.cursor()
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS sweep_plan_numbers (reco_number TEXT PRIMARY KEY)")
+    cursor.execute("DELETE FROM temp.sweep_plan_numbers")
+    cursor.executemany("INSERT OR IGNORE INTO temp.sweep_plan_numbers (reco_number) VALUES (?)", ((n,) for n in reco_numbers))
+    cursor.execute("""
+        SELECT c.reco_number, c.timestamp
+        FROM temp.sweep_plan_numbers p JOIN reco_cache c ON c.reco_number = p.reco_number
+        WHERE c.timestamp > ?
+    """, (time.time() - reco_api.CACHE_EXPIRY_SECONDS,))
+    cache_timestamps = {row["reco_number"]: row["timestamp"] for row in cursor.fetchall()}
+    cursor.execute("DELETE FROM temp.sweep_plan_numbers")
+    return cache_timestamps
+
+def _previously_flagged_numbers(conn):
+    """Returns the RECO numbers that currently have alerts (keyed by normalized number; see database._migrate_legacy_alert_keys)."""
+    return {row["reco_number"] for row in conn.execute("SELECT reco_number FROM alerts").fetchall()}
+
+def plan_sweep(members, conn, known_statuses=None):
+    """
+    Normalizes, validates, dedupes and orders a sweep's members before any lookups happen.
+
+    Each returned member is a copy with 'reco_number' normalized (the value Wicket sent is kept in
+    'wicket_reco_number') and a 'plan_group': 'cache', 'registry' (in known_statuses), 'api',
+    'invalid' or 'missing'. Members sharing a RECO number are kept adjacent so the number is looked
+    up once. Order: previously flagged numbers first, then cache hits oldest-first (they are the ones
+    that would expire, and cost an API call, later in a long sweep), registry hits, API lookups, and
+    finally invalid/missing numbers. Returns (planned_members, plan_stats).
+    """
+    known_statuses = known_statuses or {}
+    members_by_number = {}
+    first_index_by_number = {}
+    invalid_members = []
+    missing_members = []
+
+    for member_index, member in enumerate(members):
+        wicket_reco_number = member.get("reco_number")
+        normalized = reco_api.normalize_reco_number(wicket_reco_number)
+        planned_member = dict(member, reco_number=normalized, wicket_reco_number=wicket_reco_number)
+        if not normalized:
+            planned_member["plan_group"] = PLAN_GROUP_MISSING
+            missing_members.append(planned_member)
+        elif not reco_api.is_valid_reco_number(normalized):
+            planned_member["plan_group"] = PLAN_GROUP_INVALID
+            invalid_members.append(planned_member)
+        else:
+            members_by_number.setdefault(normalized, []).append(planned_member)
+            first_index_by_number.setdefault(normalized, member_index)
+
+    cache_timestamps = _fresh_cache_timestamps(conn, members_by_number.keys())
+    flagged_numbers = _previously_flagged_numbers(conn)
+
+    def group_for(reco_number):
+        if reco_number in known_statuses:
+            return PLAN_GROUP_REGISTRY
+        if reco_number in cache_timestamps:
+            return PLAN_GROUP_CACHE
+        return PLAN_GROUP_API
+
+    groups = {reco_number: group_for(reco_number) for reco_number in members_by_number}
+    ordered_numbers = sorted(members_by_number, key=lambda n: (
+        0 if n in flagged_numbers else 1,
+        _GROUP_RANK[groups[n]],
+        cache_timestamps.get(n, 0),
+        first_index_by_number[n],
+    ))
+
+    planned_members = []
+    for reco_number in ordered_numbers:
+        for planned_member in members_by_number[reco_number]:
+            planned_member["plan_group"] = groups[reco_number]
+            planned_members.append(planned_member)
+    planned_members.extend(invalid_members)
+    planned_members.extend(missing_members)
+
+    group_counts = {group: 0 for group in _GROUP_RANK}
+    for reco_number in ordered_numbers:
+        group_counts[groups[reco_number]] += 1
+    valid_member_count = sum(len(group) for group in members_by_number.values())
+    plan_stats = {
+        "unique_reco_numbers": len(ordered_numbers),
+        "duplicate_reco_numbers": valid_member_count - len(ordered_numbers),
+        "previously_flagged_prioritized": sum(1 for n in ordered_numbers if n in flagged_numbers),
+        "planned_cache_hits": group_counts[PLAN_GROUP_CACHE],
+        "planned_registry_hits": group_counts[PLAN_GROUP_REGISTRY],
+        "planned_api_lookups": group_counts[PLAN_GROUP_API],
+    }
+    logger.info(f"Sweep plan: {len(members)} members, {plan_stats['unique_reco_numbers']} unique RECO numbers "
+                f"({plan_stats['planned_cache_hits']} cached, {plan_stats['planned_registry_hits']} registry, {plan_stats['planned_api_lookups']} API), "
+                f"{len(invalid_members)} invalid, {len(missing_members)} missing.")
+    return planned_members, plan_stats
@@ -0,0 +1,68 @@
+import time
+import multiprocessing
+
+import pytest
+import requests
+
+from app import database
+
+MEMBER_COUNT = 24
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+def fake_get(url, headers=None, params=None, timeout=None):
+    if url.endswith("/members"):
+        return FakeResponse({"members": [{"name": f"Member {i}", "recoNumber": str(1000 + i)} for i in range(MEMBER_COUNT)]})
+    # Slow enough that both workers get shards; every third number is expired.
+    time.sleep(0.05)
+    reco_number = int(params["registrationNumber"])
+    return FakeResponse([{"statusDescription": "Expired" if reco_number % 3 == 0 else "Active"}])
+
+
+@pytest.fixture
+def sharded_sweep(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_DIR", tmp_path)
+    monkeypatch.setattr(database, "DB_FILE", tmp_path / "test.sqlite3")
+    database.init_db()
+    monkeypatch.setattr(requests, "get", fake_get)
+    # Imported after the database is redirected: reco_api checks its table on import.
+    from app import sharded_sweep
+    from app.integrations import wicket_api, reco_registry
+    monkeypatch.setattr(wicket_api, "WICKET_API_TOKEN", "test-token")
+    monkeypatch.setattr(reco_registry, "SWEEP_USE_RECO_REGISTRY", False)
+    # Worker processes must inherit the patches above, whatever the platform's default start method.
+    monkeypatch.setattr(sharded_sweep, "multiprocessing", multiprocessing.get_context("fork"))
+    return sharded_sweep
+
+
+def test_two_workers_complete_sweep_and_return_flagged_members(sharded_sweep):
+    result = sharded_sweep.perform_sharded_license_validation_sweep(shard_count=4, worker_count=2)
+
+    assert result["status"] == "completed"
+    assert result["summary"]["total_wicket_members_processed"] == MEMBER_COUNT
+    assert len(result["all_processed_members"]) == MEMBER_COUNT
+    expected_flagged = {str(1000 + i) for i in range(MEMBER_COUNT) if (1000 + i) % 3 == 0}
+    assert {alert["reco_number"] for alert in result["flagged_this_run"]} == expected_flagged
+    assert result["newly_flagged_members_count"] == len(expected_flagged)
+
+    conn = database.get_db_connection()
+    try:
+        shard_owners = {row["lease_owner"] for row in conn.execute("SELECT lease_owner FROM sweep_shards WHERE status = 'done'")}
+        alert_numbers = {row["reco_number"] for row in conn.execute("SELECT reco_number FROM alerts")}
+        run_count = conn.execute("SELECT COUNT(*) FROM run_history").fetchone()[0]
+    finally:
+        conn.close()
+    assert len(shard_owners) == 2
+    assert alert_numbers == expected_flagged
+    assert run_count == 1